@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from .database import database_config
+
 
 # This is required by django-allauth
 SITE_ID = 1
@@ -88,11 +90,9 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# SQLite unless DATABASE_URL is set; see backend/database.py for the PostgreSQL profile
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(os.environ.get('DATABASE_URL', ''), BASE_DIR / 'db.sqlite3'),
 }
 
 # Password validation
@@ -138,7 +138,7 @@ ACCOUNT_EMAIL_VERIFICATION = "none"
 # Unified Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'grievance_api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -156,4 +156,123 @@ AUTHENTICATION_BACKENDS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+MEDIA_SERVING = {
+    # 'x-accel-redirect' behind nginx (an `internal` location at ACCEL_PREFIX aliased to
+    # MEDIA_ROOT), 'x-sendfile' behind Apache; unset serves from Python with sendfile()
+    'OFFLOAD': os.environ.get('MEDIA_OFFLOAD') or None,
+    'ACCEL_PREFIX': '/protected-media/',
+    'URL_TTL': 6 * 3600,  # signed media URLs handed out by the API
+    'URL_WINDOW': 3600,
+}
+
+STORAGES = {
+    # uploads are stored once per distinct content, see grievance_api/storage.py
+    'default': {'BACKEND': 'grievance_api.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# AI complaint-type suggestions.
+# Set SOCKET_PATH to the socket of `manage.py run_suggestion_server` so all workers
+# share one batched model; leave it empty to load the model inside each process.
+SUGGESTION_INFERENCE = {
+    # 'precomputed' and 'pipeline' run the BART-MNLI cross-encoder (slower, more accurate);
+    # 'embedding' ranks categories by cosine similarity with a small sentence encoder;
+    # 'quantized' runs the int8 artifact from `manage.py export_suggestion_model`
+    'ENGINE': os.environ.get('SUGGESTION_ENGINE', 'precomputed'),
+    'MODEL': os.environ.get('SUGGESTION_MODEL', ''),  # model name, or artifact dir for 'quantized'
+    'SOCKET_PATH': os.environ.get('SUGGESTION_SOCKET_PATH', ''),
+    'TIMEOUT': float(os.environ.get('SUGGESTION_TIMEOUT', '2.0')),  # seconds
+    'LOAD_TIMEOUT': 120.0,  # in-process: the first request in a lazy worker waits this long for the model
+    'MAX_BATCH_SIZE': 8,
+    'MAX_WAIT_MS': 20,
+    'MAX_QUEUE': 64,  # queued requests before answering 202 with Retry-After
+    'RETRY_AFTER': 1,
+    # 'lazy' | 'boot' | 'prefork' — see gunicorn.conf.py
+    'PRELOAD': os.environ.get('SUGGESTION_PRELOAD', 'lazy'),
+}
+
+# Caches. 'suggestions' is file-based so every worker on the host shares entries.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'suggestions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SUGGESTION_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'suggestions')),
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # small values every worker on the host should agree on (dashboard snapshots etc.)
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SHARED_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'shared')),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 20000},  # per-user roles and auth stamps
+    },
+}
+
+SUGGESTION_CACHE = {
+    'CACHE_ALIAS': 'suggestions',
+    'LOCAL_MAX_ENTRIES': 1024,  # per-worker LRU in front of the shared cache
+    'LOCAL_TTL': 300,
+    'SHARED_TTL': 3600,
+    'VERSION_TTL': 5,  # how soon other workers notice a category edit
+}
+
+SCHEDULER = {
+    # `manage.py run_scheduler`; any number may run, one holds the lease and runs jobs
+    'LEASE_SECONDS': 60,  # renewed every third of this while a job runs
+    'TICK_SECONDS': 5,
+    'JITTER': 0.1,
+    'MAX_BACKOFF': 3600,
+    'JOBS': {  # seconds between runs; 0 disables a job
+        'escalate': int(os.environ.get('SCHEDULER_ESCALATE_INTERVAL', '300')),
+        'refresh_stats': 25,  # just under ADMIN_STATS['TTL'], so dashboards never recompute
+        'cleanup': 86400,
+        'process_images': 60,  # gallery photos stored with IMAGE_PIPELINE['PROCESS_ON_UPLOAD'] off
+    },
+}
+
+TOKEN_AUTH_CACHE = {
+    'CACHE_ALIAS': 'shared',  # revocation stamps checked on every cached hit
+    'LOCAL_MAX_ENTRIES': 2048,  # tokens remembered per worker
+    'LOCAL_TTL': 60,
+}
+
+# one handler spools every file and enforces UPLOADS limits while the body is read
+FILE_UPLOAD_HANDLERS = ['grievance_api.uploads.SpooledUploadHandler']
+
+UPLOADS = {
+    'MAX_FILE_SIZE': int(os.environ.get('UPLOAD_MAX_FILE_MB', '15')) * 1024 * 1024,
+    'MAX_TOTAL_SIZE': int(os.environ.get('UPLOAD_MAX_TOTAL_MB', '50')) * 1024 * 1024,
+    'MAX_FILES': 10,  # per request, across all file fields
+    'SPOOL_MEMORY_SIZE': 1024 * 1024,  # larger files go to FILE_UPLOAD_TEMP_DIR
+    'CHUNK_SIZE': 64 * 1024,
+}
 
+IMAGE_PIPELINE = {
+    # uploaded photos are stored upright, EXIF-free and re-encoded (see grievance_api/images.py)
+    'FORMAT': os.environ.get('IMAGE_FORMAT', 'WEBP'),  # WEBP or JPEG
+    'QUALITY': 82,
+    'MAX_DIMENSION': 2048,
+    'MEDIUM_DIMENSION': 1024,
+    'THUMBNAIL_SIZE': 256,
+    'THUMBNAIL_QUALITY': 70,
+    'PROCESS_ON_UPLOAD': True,  # False leaves gallery photos to the scheduler's process_images job
+}
+
+ADMIN_STATS = {
+    'CACHE_ALIAS': 'shared',
+    'TTL': int(os.environ.get('ADMIN_STATS_TTL', '30')),  # seconds a snapshot is served before recomputing
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'grievance_api': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
@@ -1,12 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from grievance_api.media import MediaView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('grievance_api.urls')),  # ✅ CRITICAL: api/ prefix
+    # access-checked, cacheable media in every environment (see grievance_api/media.py)
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:name>", MediaView.as_view(), name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Under `gunicorn --preload` this runs once in the master, before workers fork
+from grievance_api import inference  # noqa: E402
+
+inference.preload('master')
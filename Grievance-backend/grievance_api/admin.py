@@ -1,8 +1,10 @@
 from django.contrib import admin
-from .models import Grievance, Department, SubDepartment, Category
+from .models import Grievance, Department, SubDepartment, Category, ScheduledJob, SchedulerLease
 
 # Register all relevant models for admin management
 admin.site.register(Grievance)
 admin.site.register(Department)
 admin.site.register(SubDepartment)
 admin.site.register(Category)
+admin.site.register(ScheduledJob)
+admin.site.register(SchedulerLease)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GrievanceApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'grievance_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
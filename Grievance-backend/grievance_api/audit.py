@@ -0,0 +1,78 @@
+"""
+Grievance audit trail.
+
+Changes are diffed against the field values the instance had when tracking
+started, so no extra read is needed. All resulting ``GrievanceEvent`` rows are
+written with one ``bulk_create`` inside the same transaction as the change
+itself::
+
+    with audit.track(grievance, request.user) as changes:
+        serializer.save()
+        changes.add('SOMETHING_ELSE', 'notes')   # optional explicit events
+"""
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .models import GrievanceEvent
+
+# field -> (action, notes for (old, new)); file fields only log new uploads
+TRACKED_FIELDS = {
+    'status': ('STATUS_CHANGED', lambda old, new: f'{old} -> {new}'),
+    'due_date': ('DUE_DATE_UPDATED', lambda old, new: f'{old} -> {new}'),
+    'resolution_notes': ('RESOLUTION_NOTES_UPDATED', lambda old, new: 'Updated'),
+    'signed_document': ('SIGNED_DOCUMENT_UPLOADED', lambda old, new: new),
+    'resolution_image': ('RESOLUTION_IMAGE_UPLOADED', lambda old, new: new),
+}
+FILE_FIELDS = {'signed_document', 'resolution_image'}
+
+
+def event(grievance_id, action, notes='', user=None, extra_data=None):
+    """An unsaved event, for callers that batch their own writes."""
+    return GrievanceEvent(grievance_id=grievance_id, user=user, action=action, notes=notes, extra_data=extra_data)
+
+
+def write(events):
+    return GrievanceEvent.objects.bulk_create(events) if events else []
+
+
+def _value(grievance, field):
+    value = getattr(grievance, field)
+    if field in FILE_FIELDS:
+        return value.name if value else None
+    return value
+
+
+class Changes:
+    def __init__(self, grievance, user=None, diff=True):
+        self.grievance = grievance
+        self.user = user
+        self.before = {field: _value(grievance, field) for field in TRACKED_FIELDS} if diff else None
+        self.extra = []
+
+    def add(self, action, notes='', extra_data=None):
+        self.extra.append((action, notes, extra_data))
+
+    def events(self):
+        events = []
+        for field, old in (self.before or {}).items():
+            new = _value(self.grievance, field)
+            if old == new or (field in FILE_FIELDS and not new):
+                continue
+            action, notes = TRACKED_FIELDS[field]
+            events.append(event(self.grievance.pk, action, notes(old, new), user=self.user))
+        for action, notes, extra_data in self.extra:
+            events.append(event(self.grievance.pk, action, notes, user=self.user, extra_data=extra_data))
+        return events
+
+    def write(self):
+        return write(self.events())
+
+
+@contextmanager
+def track(grievance, user=None, diff=True):
+    """Run the block and write its audit events in one transaction; see the module docstring."""
+    changes = Changes(grievance, user, diff=diff)
+    with transaction.atomic():
+        yield changes
+        changes.write()
@@ -0,0 +1,89 @@
+"""
+Token authentication without a database hit per request.
+
+DRF's ``TokenAuthentication`` joins ``Token`` and ``User`` on every call. Here
+the resolved user is kept in a bounded per-worker LRU, keyed by a hash of the
+token, for ``TOKEN_AUTH_CACHE['LOCAL_TTL']`` seconds. Each entry remembers the
+user's revocation stamp from the shared cache, and the stamp is compared on
+every hit, which is a cache read, not a query. Logging out (deleting the
+token), saving the user (password change, deactivation) or deleting the user
+bumps the stamp, so every worker drops the entry on its next lookup. If the
+stamp itself is evicted, staleness is still bounded by the LRU's TTL.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .lru import LRUCache
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'shared',
+    'LOCAL_MAX_ENTRIES': 2048,
+    'LOCAL_TTL': 60,  # seconds
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+_config = get_config()
+local_cache = LRUCache(_config['LOCAL_MAX_ENTRIES'], _config['LOCAL_TTL'])
+
+
+def _token_hash(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _stamp_key(user_pk):
+    return f'auth:stamp:{user_pk}'
+
+
+def revocation_stamp(user_pk):
+    return caches[get_config()['CACHE_ALIAS']].get(_stamp_key(user_pk))
+
+
+def revoke(user_pk):
+    """Make every worker re-check this user's tokens against the database."""
+    caches[get_config()['CACHE_ALIAS']].set(_stamp_key(user_pk), time.time_ns(), timeout=None)
+
+
+def _snapshot(user):
+    fields = [f.attname for f in user._meta.concrete_fields]
+    return user._state.db, fields, [getattr(user, name) for name in fields]
+
+
+def _restore(db, fields, values):
+    # a fresh instance per request, so per-request memos (roles) never outlive it
+    return get_user_model().from_db(db, fields, values)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        token_hash = _token_hash(key)
+        entry = local_cache.get(token_hash)
+        if entry is not None:
+            user_pk, stamp, db, fields, values, token = entry
+            if revocation_stamp(user_pk) == stamp:
+                user = _restore(db, fields, values)
+                if not user.is_active:
+                    raise exceptions.AuthenticationFailed('User inactive or deleted.')
+                return user, token
+
+        # the stamp is read before the user is loaded: a revocation landing in between
+        # changes it, so the entry cached below is already stale instead of trusted
+        user_pk = self.get_model().objects.filter(key=key).values_list('user_id', flat=True).first()
+        if user_pk is None:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        stamp = revocation_stamp(user_pk)
+
+        user, token = super().authenticate_credentials(key)
+        # the token is kept without its user, which is rebuilt per request
+        bare_token = type(token)(key=token.key, user_id=token.user_id, created=token.created)
+        local_cache.set(token_hash, (user.pk, stamp, *_snapshot(user), bare_token))
+        return user, token
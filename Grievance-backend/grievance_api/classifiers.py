@@ -0,0 +1,280 @@
+"""
+Complaint-type classification engines.
+
+Each engine scores every (description, label) pair; ``classify`` returns the
+top labels per description and ``rank`` the top labels with their confidence. torch/transformers are imported inside the
+engines so that merely importing this module stays cheap.
+"""
+import json
+import os
+
+import numpy as np
+from django.conf import settings
+
+from .inference import InferenceUnavailable
+from .models import Category
+
+MODEL_NAME = "facebook/bart-large-mnli"
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+HYPOTHESIS_TEMPLATE = "This example is {}."
+ARTIFACT_METADATA = "suggestion_artifact.json"
+TOP_K = 3
+
+# Used when the Category table is empty (fresh database)
+COMPLAINT_LABELS = [
+    "Uncollected garbage", "Garbage dumping", "Contaminated water supply",
+    "Mosquitoes problems", "Issues with food quality", "Pothole Repair",
+    "Streetlight Malfunction", "Low Water Pressure", "Blocked Sewers / Drainage",
+    "Stormwater Drain Issues", "Other"
+]
+
+# Leaf categories that are workflow buckets rather than complaint types
+EXCLUDED_CATEGORIES = ["In Review"]
+
+
+def candidate_labels():
+    """Leaf category names citizens can file under, in a stable order."""
+    names = (
+        Category.objects
+        .filter(subcategories__isnull=True)
+        .exclude(name__in=EXCLUDED_CATEGORIES)
+        .order_by('name')
+        .values_list('name', flat=True)
+    )
+    return tuple(names) or tuple(COMPLAINT_LABELS)
+
+
+def default_artifact_dir():
+    return os.path.join(settings.BASE_DIR, 'models', 'suggest-int8')
+
+
+class Engine:
+    """Subclasses implement ``scores(descriptions, labels) -> (labels, array[n, len(labels)])``."""
+    name = None
+
+    def scores(self, descriptions, labels):
+        raise NotImplementedError
+
+    def rank(self, descriptions, labels, k=TOP_K):
+        labels, scores = self.scores(list(descriptions), labels)
+        order = np.argsort(-scores, axis=1)[:, :k]
+        return [[(labels[i], float(scores[row, i])) for i in top] for row, top in enumerate(order)]
+
+    def classify(self, descriptions, labels):
+        return [[label for label, _ in ranked] for ranked in self.rank(descriptions, labels)]
+
+
+def _softmax(logits):
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+class PipelineEngine(Engine):
+    """The stock transformers zero-shot pipeline (re-tokenizes every hypothesis per call)."""
+    name = 'pipeline'
+
+    def __init__(self, model_name=MODEL_NAME):
+        from transformers import pipeline
+        self.pipe = pipeline("zero-shot-classification", model=model_name)
+
+    def scores(self, descriptions, labels):
+        labels = tuple(labels)
+        results = self.pipe(
+            descriptions,
+            candidate_labels=list(labels),
+            hypothesis_template=HYPOTHESIS_TEMPLATE,
+            batch_size=len(descriptions) * len(labels),
+        )
+        if isinstance(results, dict):
+            results = [results]
+        matrix = np.array([
+            [dict(zip(r["labels"], r["scores"]))[label] for label in labels] for r in results
+        ])
+        return labels, matrix
+
+
+class PrecomputedHypothesisEngine(Engine):
+    """
+    Same NLI model and scoring as the pipeline, but the "This example is {label}."
+    hypotheses are tokenized once per label set and reused. Per call only the
+    descriptions are tokenized, and every (description, label) pair goes through
+    the model in one padded forward pass.
+
+    BART is a cross-encoder, so hypotheses cannot be encoded independently of the
+    premise; what is cached is their token ids, not hidden states.
+    """
+    name = 'precomputed'
+
+    def __init__(self, model_name=MODEL_NAME):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+
+        label2id = {k.lower(): v for k, v in self.model.config.label2id.items()}
+        self.entailment_id = next(v for k, v in label2id.items() if k.startswith('entail'))
+        self.max_length = min(self.tokenizer.model_max_length, 1024)
+
+        self._prepared = None
+
+    def prepare(self, labels):
+        """Tokenize the hypotheses once per label set; returns ``(labels, hypothesis_ids)``."""
+        labels = tuple(labels)
+        prepared = self._prepared
+        if prepared and prepared[0] == labels:
+            return prepared
+        encoded = self.tokenizer(
+            [HYPOTHESIS_TEMPLATE.format(label) for label in labels],
+            add_special_tokens=False,
+        )
+        # swapped in one assignment so concurrent callers never see a half-built set
+        self._prepared = (labels, encoded['input_ids'])
+        return self._prepared
+
+    def _pair_arrays(self, descriptions, hypothesis_ids):
+        longest_hypothesis = max(len(ids) for ids in hypothesis_ids)
+        premise_ids = self.tokenizer(
+            list(descriptions),
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self.max_length - longest_hypothesis - 4,  # room for <s></s></s>...</s>
+        )['input_ids']
+
+        rows = [
+            self.tokenizer.build_inputs_with_special_tokens(premise, hypothesis)
+            for premise in premise_ids
+            for hypothesis in hypothesis_ids
+        ]
+        width = max(len(row) for row in rows)
+        input_ids = np.full((len(rows), width), self.tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        for i, row in enumerate(rows):
+            input_ids[i, :len(row)] = row
+            attention_mask[i, :len(row)] = 1
+        return input_ids, attention_mask
+
+    def logits(self, input_ids, attention_mask):
+        with self.torch.inference_mode():
+            output = self.model(
+                input_ids=self.torch.from_numpy(input_ids),
+                attention_mask=self.torch.from_numpy(attention_mask),
+            )
+        return output.logits.numpy()
+
+    def scores(self, descriptions, labels):
+        labels, hypothesis_ids = self.prepare(labels)
+        logits = self.logits(*self._pair_arrays(descriptions, hypothesis_ids))
+
+        # single-label zero-shot, as in the pipeline: softmax of entailment logits across labels
+        entailment = logits[:, self.entailment_id].reshape(len(descriptions), len(labels))
+        return labels, _softmax(entailment)
+
+
+class QuantizedEngine(PrecomputedHypothesisEngine):
+    """
+    The precomputed-hypothesis engine running an int8 artifact written by
+    ``manage.py export_suggestion_model`` instead of the full-precision model.
+    ONNX artifacts run on onnxruntime and do not need torch at serve time.
+    """
+    name = 'quantized'
+
+    def __init__(self, model_name=None):
+        artifact_dir = model_name or default_artifact_dir()
+        try:
+            with open(os.path.join(artifact_dir, ARTIFACT_METADATA)) as f:
+                self.metadata = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise InferenceUnavailable(
+                f"No quantized model in {artifact_dir} (run manage.py export_suggestion_model): {exc}"
+            ) from exc
+
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(artifact_dir)
+        self.entailment_id = self.metadata['entailment_id']
+        self.max_length = self.metadata['max_length']
+        self._prepared = None
+
+        model_path = os.path.join(artifact_dir, self.metadata['file'])
+        if self.metadata['format'] == 'onnx':
+            import onnxruntime
+            self.session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        else:
+            import torch
+            self.torch = torch
+            self.module = torch.jit.load(model_path)
+
+    def logits(self, input_ids, attention_mask):
+        if self.metadata['format'] == 'onnx':
+            return self.session.run(['logits'], {'input_ids': input_ids, 'attention_mask': attention_mask})[0]
+        with self.torch.inference_mode():
+            output = self.module(self.torch.from_numpy(input_ids), self.torch.from_numpy(attention_mask))
+        return output[0].numpy()
+
+
+class EmbeddingEngine(Engine):
+    """
+    Fast path: a small sentence encoder embeds each category's name and
+    description once into a unit-normalised matrix, and descriptions are ranked
+    by a single cosine-similarity product against it.
+    """
+    name = 'embedding'
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).eval()
+        self._prepared = None
+
+    def embed(self, texts):
+        """Mean-pooled, L2-normalised sentence embeddings as a float32 array."""
+        batch = self.tokenizer(list(texts), padding=True, truncation=True, max_length=256, return_tensors='pt')
+        with self.torch.inference_mode():
+            hidden = self.model(**batch).last_hidden_state
+        mask = batch['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+        pooled = ((hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)).numpy()
+        return _normalise(pooled)
+
+    def prepare(self, labels):
+        """Embed the categories once per label set; returns ``(labels, matrix)``."""
+        labels = tuple(labels)
+        prepared = self._prepared
+        if prepared and prepared[0] == labels:
+            return prepared
+        descriptions = dict(
+            Category.objects.filter(name__in=labels).values_list('name', 'description')
+        )
+        texts = [f"{label}. {descriptions.get(label) or ''}".strip() for label in labels]
+        self._prepared = (labels, self.embed(texts))
+        return self._prepared
+
+    def scores(self, descriptions, labels):
+        labels, matrix = self.prepare(labels)
+        return labels, self.embed(descriptions) @ matrix.T
+
+
+def _normalise(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+ENGINES = {
+    PipelineEngine.name: PipelineEngine,
+    PrecomputedHypothesisEngine.name: PrecomputedHypothesisEngine,
+    QuantizedEngine.name: QuantizedEngine,
+    EmbeddingEngine.name: EmbeddingEngine,
+}
+
+
+def load_engine(name, model_name=None):
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown suggestion engine {name!r}; choose from {sorted(ENGINES)}")
+    return engine_class(model_name) if model_name else engine_class()
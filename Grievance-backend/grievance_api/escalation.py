@@ -0,0 +1,104 @@
+"""
+Set-based SLA escalation.
+
+Overdue grievances move one stage up in batches. Each batch is one
+transaction with one UPDATE, driven by the (status, due_date) index, and one
+bulk INSERT of audit events (see ``audit.py``). Nothing goes through
+``Grievance.save()``, so what it would have done is repeated here in SQL:
+``updated_at`` is bumped, and the new due date is today plus the department's
+SLA, or the stage default when there is no department.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, DateField, Value, When
+from django.utils import timezone
+
+from . import audit
+from .models import STATUS_SLA_DAYS, Grievance, department_sla_days
+
+# (from status, to status), applied in this order
+ESCALATIONS = [
+    ('In Review', 'Pending Approval'),    # triage missed its SLA
+    ('In Progress', 'Policy Decision'),   # department missed its SLA
+]
+
+EVENT_ACTION = 'SLA_ESCALATED'
+
+
+def overdue(status, today):
+    return Grievance.objects.filter(status=status, due_date__lt=today)
+
+
+def departments_by_sla():
+    by_sla = {}
+    for pk, sla_days in department_sla_days().items():
+        by_sla.setdefault(sla_days, []).append(pk)
+    return by_sla
+
+
+def new_due_date(status, today, by_sla):
+    """SQL for the due date a grievance gets on entering ``status`` (mirrors ``Grievance.save``)."""
+    default = Value(today + timedelta(days=STATUS_SLA_DAYS[status]), output_field=DateField())
+    if not by_sla:
+        return default
+    return Case(
+        *[
+            When(department_id__in=pks, then=Value(today + timedelta(days=sla_days)))
+            for sla_days, pks in by_sla.items()
+        ],
+        default=default,
+        output_field=DateField(),
+    )
+
+
+def escalate_batch(from_status, to_status, today, batch_size, due_date):
+    """Escalate up to ``batch_size`` overdue rows; returns how many moved."""
+    with transaction.atomic():
+        rows = list(
+            overdue(from_status, today)
+            .select_for_update()
+            .order_by('pk')
+            .values_list('pk', 'due_date')[:batch_size]
+        )
+        if not rows:
+            return 0
+        # update() skips auto_now, so updated_at is set as save() would
+        Grievance.objects.filter(pk__in=[pk for pk, _ in rows]).update(
+            status=to_status, due_date=due_date, updated_at=timezone.now(),
+        )
+        audit.write([
+            audit.event(
+                pk, EVENT_ACTION, f'{from_status} -> {to_status}',
+                extra_data={'from': from_status, 'to': to_status, 'overdue_since': str(old_due)},
+            )
+            for pk, old_due in rows
+        ])
+    return len(rows)
+
+
+def escalate(batch_size=1000, dry_run=False, today=None, on_batch=None):
+    """
+    Run every escalation; returns ``{(from, to): count}``.
+
+    With ``dry_run`` nothing is written and the counts are what would move.
+    ``on_batch(from_status, to_status, moved)`` is called after each batch.
+    """
+    today = today or timezone.now().date()
+    results = {}
+    by_sla = None if dry_run else departments_by_sla()
+    for from_status, to_status in ESCALATIONS:
+        if dry_run:
+            results[(from_status, to_status)] = overdue(from_status, today).count()
+            continue
+        due_date = new_due_date(to_status, today, by_sla)
+        total = 0
+        while True:
+            moved = escalate_batch(from_status, to_status, today, batch_size, due_date)
+            if not moved:
+                break
+            total += moved
+            if on_batch:
+                on_batch(from_status, to_status, total)
+        results[(from_status, to_status)] = total
+    return results
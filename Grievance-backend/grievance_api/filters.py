@@ -0,0 +1,64 @@
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from . import search
+from .models import OPEN_STATUSES
+
+
+class GrievanceFilterBackend(BaseFilterBackend):
+    """
+    Server-side filters for grievance lists, applied on top of the role-scoped queryset:
+
+    ``status``       one or more statuses, comma separated
+    ``department``   department id or name
+    ``category``     category id or name
+    ``due_after`` / ``due_before``   inclusive due-date range (YYYY-MM-DD)
+    ``overdue``      ``true``: open and past due; ``false``: everything else
+    ``search``       words in the title, description or location (full-text index, see search.py)
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        statuses = [s.strip() for s in params.get('status', '').split(',') if s.strip()]
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+
+        department = params.get('department')
+        if department:
+            if department.isdigit():
+                queryset = queryset.filter(department_id=department)
+            else:
+                queryset = queryset.filter(department__name=department)
+
+        category = params.get('category')
+        if category:
+            if category.isdigit():
+                queryset = queryset.filter(category_id=category)
+            else:
+                queryset = queryset.filter(category__name=category)
+
+        for param, lookup in (('due_after', 'due_date__gte'), ('due_before', 'due_date__lte')):
+            if params.get(param):
+                try:
+                    day = parse_date(params[param])
+                except ValueError:  # well formed but impossible, e.g. 2024-02-30
+                    day = None
+                if day is None:
+                    raise ValidationError({param: 'Use YYYY-MM-DD.'})
+                queryset = queryset.filter(**{lookup: day})
+
+        overdue = params.get('overdue', '').lower()
+        if overdue in ('true', '1', 'false', '0'):
+            # spelled exactly like grievance_open_due_idx's condition so the partial index applies
+            is_overdue = Q(status__in=OPEN_STATUSES, due_date__lt=timezone.now().date())
+            queryset = queryset.filter(is_overdue if overdue in ('true', '1') else ~is_overdue)
+
+        text = params.get('search', '').strip()
+        if text:
+            queryset = search.matching(queryset, text)
+
+        return queryset
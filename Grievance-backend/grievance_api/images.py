@@ -0,0 +1,142 @@
+"""
+Photo ingestion.
+
+Citizen photos come straight off phones: several megabytes, thousands of
+pixels wide, rotated by an EXIF tag and often carrying GPS coordinates.
+Before an uploaded photo is stored it is turned upright, stripped of all
+metadata, bounded to ``MAX_DIMENSION`` and re-encoded as ``FORMAT`` at
+``QUALITY``. Gallery photos (``GrievanceImage``) also get a ``medium``
+rendition for the viewer and a fixed-size square ``thumbnail`` for the
+gallery strip, so the dashboards never download an original to draw a preview.
+
+Gallery photos are processed on upload, or by the scheduler's
+``process_images`` job when ``PROCESS_ON_UPLOAD`` is off. Files Pillow cannot
+decode are stored as they came.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'FORMAT': 'WEBP',  # or 'JPEG'
+    'QUALITY': 82,
+    'MAX_DIMENSION': 2048,  # longest side of the stored original, px
+    'MEDIUM_DIMENSION': 1024,
+    'THUMBNAIL_SIZE': 256,  # square, centre-cropped
+    'THUMBNAIL_QUALITY': 70,
+    'PROCESS_ON_UPLOAD': True,
+}
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IMAGE_PIPELINE', {})}
+
+
+def _load(file, bound, fmt):
+    file.seek(0)
+    image = Image.open(file)
+    # JPEG can decode straight to a smaller scale, which skips most of the work for phone photos
+    image.draft('RGB', (bound, bound))
+    image = _flatten(ImageOps.exif_transpose(image), fmt)
+    image.thumbnail((bound, bound), Image.Resampling.LANCZOS)
+    return image
+
+
+def _flatten(image, fmt):
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    if not has_alpha:
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    if fmt == 'WEBP':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def _encode(image, name, fmt, quality):
+    out = BytesIO()
+    options = {'quality': quality}
+    if fmt == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    # nothing from image.info (EXIF, XMP, ICC) is passed on, so the output carries no metadata
+    image.save(out, fmt, **options)
+    return ContentFile(out.getvalue(), name=f'{name}.{EXTENSIONS[fmt]}')
+
+
+def _stem(file):
+    return os.path.splitext(os.path.basename(file.name or 'image'))[0] or 'image'
+
+
+def normalise(file, config=None):
+    """The re-encoded, metadata-free, size-bounded copy of ``file``, or None if it isn't an image."""
+    return renditions(file, config, derived=False).get('image')
+
+
+def renditions(file, config=None, derived=True):
+    """
+    ``{'image', 'medium', 'thumbnail'}`` as unsaved ``ContentFile``s, or ``{}``
+    if Pillow cannot read ``file``. Each rendition is scaled from the previous
+    one, so the full-size decode happens once.
+    """
+    config = config or get_config()
+    fmt = config['FORMAT'].upper()
+    stem = _stem(file)
+    try:
+        image = _load(file, config['MAX_DIMENSION'], fmt)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        logger.warning('Storing %s unprocessed: %s', file.name, exc)
+        return {}
+
+    result = {'image': _encode(image, stem, fmt, config['QUALITY'])}
+    if derived:
+        medium = image.copy()
+        medium.thumbnail((config['MEDIUM_DIMENSION'],) * 2, Image.Resampling.LANCZOS)
+        result['medium'] = _encode(medium, f'{stem}_medium', fmt, config['QUALITY'])
+
+        size = config['THUMBNAIL_SIZE']
+        thumbnail = ImageOps.fit(medium, (size, size), Image.Resampling.LANCZOS)
+        result['thumbnail'] = _encode(thumbnail, f'{stem}_thumb', fmt, config['THUMBNAIL_QUALITY'])
+    return result
+
+
+def process(gallery_image):
+    """Swap a ``GrievanceImage``'s upload for its renditions; the caller saves the row."""
+    out = renditions(gallery_image.image)
+    gallery_image.processed_at = timezone.now()
+    if out:
+        gallery_image.image = out['image']
+        gallery_image.medium = out['medium']
+        gallery_image.thumbnail = out['thumbnail']
+    return bool(out)
+
+
+def process_pending(batch_size=100):
+    """Process gallery photos stored while ``PROCESS_ON_UPLOAD`` was off; returns how many were done."""
+    from .models import GrievanceImage
+
+    done = 0
+    for gallery_image in GrievanceImage.objects.filter(processed_at__isnull=True).order_by('pk')[:batch_size]:
+        original = gallery_image.image.name
+        storage = gallery_image.image.storage
+        try:
+            with gallery_image.image.open('rb'):
+                processed = process(gallery_image)
+        except FileNotFoundError:
+            logger.warning('Gallery photo %s is missing %s', gallery_image.pk, original)
+            gallery_image.processed_at = timezone.now()
+            processed = False
+        gallery_image.save(update_fields=['image', 'medium', 'thumbnail', 'processed_at'])
+        if processed and gallery_image.image.name != original:
+            storage.delete(original)
+        done += 1
+    return done
@@ -0,0 +1,420 @@
+"""
+Complaint-type suggestion inference.
+
+The zero-shot model is large, so instead of every gunicorn worker loading its
+own copy, one long-lived process (``manage.py run_suggestion_server``) holds the
+model and answers workers over a Unix socket. Concurrent requests are grouped
+into micro-batches so a burst of citizens typing at once costs one forward
+pass per batch rather than one per request.
+
+The batcher also protects capacity while citizens type: requests carrying a
+``(session, seq)`` token are dropped once a newer one from the same session
+arrives, identical pending descriptions share a single inference, and once
+``MAX_QUEUE`` requests are waiting new ones are refused with a retry hint.
+
+When ``SUGGESTION_INFERENCE['SOCKET_PATH']`` is empty the same batcher runs
+in-process, which keeps ``runserver`` working without the service.
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENGINE': 'precomputed',
+    'MODEL': '',  # empty: the engine's default model
+    'SOCKET_PATH': '',
+    'TIMEOUT': 2.0,
+    'LOAD_TIMEOUT': 120.0,  # in-process only: how long a request may wait for the model to load
+    'MAX_BATCH_SIZE': 8,
+    'MAX_WAIT_MS': 20,
+    'MAX_QUEUE': 64,
+    'RETRY_AFTER': 1,  # seconds suggested to clients when the queue is full
+    'PRELOAD': 'lazy',
+}
+
+
+class InferenceUnavailable(Exception):
+    """The suggestion service could not answer (not running, timed out, errored)."""
+
+
+class InferenceBusy(InferenceUnavailable):
+    """The queue is saturated; try again after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__('busy')
+        self.retry_after = retry_after
+
+
+class Superseded(InferenceUnavailable):
+    """A newer request from the same session replaced this one before it ran."""
+
+    def __init__(self):
+        super().__init__('superseded')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SUGGESTION_INFERENCE', {})}
+
+
+def load_engine():
+    # imported here so web workers that never run the model skip numpy/torch/transformers
+    from . import classifiers
+    config = get_config()
+    try:
+        return classifiers.load_engine(config['ENGINE'], config['MODEL'] or None)
+    except ImportError as exc:
+        raise InferenceUnavailable(f"ML dependencies missing (pip install -r requirements-ml.txt): {exc}") from exc
+
+
+_labels = {}  # label version -> candidate labels, for the latest version only
+
+
+def current_labels():
+    """``classifiers.candidate_labels()``, queried again only when a category change bumps the label version."""
+    from . import classifiers, suggestions
+    version = suggestions.label_version()
+    labels = _labels.get(version)
+    if labels is None:
+        labels = classifiers.candidate_labels()
+        _labels.clear()
+        _labels[version] = labels
+    return labels
+
+
+def classify_batch(engine, descriptions):
+    """Top labels for each description against the current category labels."""
+    return engine.classify(descriptions, current_labels())
+
+
+class _Pending:
+    __slots__ = ('description', 'key', 'future', 'owners')
+
+    def __init__(self, description, key):
+        self.description = description
+        self.key = key
+        self.future = Future()
+        self.owners = []  # (session, seq); session None means "never superseded"
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches of at most ``max_batch_size``,
+    waiting no longer than ``max_wait`` seconds after the first one arrives.
+
+    ``submit`` coalesces requests with the same ``key`` while they are queued,
+    drops requests superseded by a higher ``seq`` from the same ``session``, and
+    raises ``InferenceBusy`` once ``max_queue`` distinct requests are waiting.
+    """
+    MAX_SESSIONS = 10000
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait=0.02, max_queue=64, retry_after=1):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self.max_queue = max(1, int(max_queue))
+        self.retry_after = retry_after
+        self._queue = queue.Queue()
+        self._pending = {}  # key -> _Pending, while queued
+        self._latest = OrderedDict()  # session -> highest seq seen
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="suggestion-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, description, key=None, session=None, seq=None):
+        key = key or description
+        with self._lock:
+            if session is not None and seq is not None:
+                latest = self._latest.get(session)
+                if latest is not None and seq < latest:
+                    future = Future()
+                    future.set_exception(Superseded())
+                    return future
+                self._latest[session] = seq
+                self._latest.move_to_end(session)
+                while len(self._latest) > self.MAX_SESSIONS:
+                    self._latest.popitem(last=False)
+
+            pending = self._pending.get(key)
+            if pending is None:
+                if len(self._pending) >= self.max_queue:
+                    raise InferenceBusy(self.retry_after)
+                pending = _Pending(description, key)
+                self._pending[key] = pending
+                self._queue.put(pending)
+            pending.owners.append((session, seq))
+            return pending.future
+
+    def _is_superseded(self, pending):
+        return all(
+            session is not None and seq is not None and seq < self._latest.get(session, seq)
+            for session, seq in pending.owners
+        )
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        runnable = []
+        with self._lock:
+            for pending in batch:
+                del self._pending[pending.key]
+                if self._is_superseded(pending):
+                    pending.future.set_exception(Superseded())
+                else:
+                    runnable.append(pending)
+        return runnable
+
+    def run_once(self):
+        """Run one batch; returns how many requests were sent to the model."""
+        batch = self._collect()
+        if not batch:
+            return 0
+        try:
+            results = self.run_batch([pending.description for pending in batch])
+        except Exception as exc:
+            logger.exception("Suggestion batch of %d failed", len(batch))
+            for pending in batch:
+                pending.future.set_exception(exc)
+            return len(batch)
+        for pending, result in zip(batch, results):
+            pending.future.set_result(result)
+        return len(batch)
+
+    def _loop(self):
+        while True:
+            self.run_once()
+
+
+def batcher_from_config(run_batch):
+    config = get_config()
+    return MicroBatcher(
+        run_batch,
+        max_batch_size=config['MAX_BATCH_SIZE'],
+        max_wait=config['MAX_WAIT_MS'] / 1000.0,
+        max_queue=config['MAX_QUEUE'],
+        retry_after=config['RETRY_AFTER'],
+    )
+
+
+def _error_reply(exc):
+    if isinstance(exc, InferenceBusy):
+        return {'error': 'busy', 'retry_after': exc.retry_after}
+    if isinstance(exc, Superseded):
+        return {'error': 'superseded'}
+    if isinstance(exc, FutureTimeout):
+        return {'error': 'timeout'}
+    return {'error': str(exc)}
+
+
+def _raise_for_reply(reply):
+    error = reply['error']
+    if error == 'busy':
+        raise InferenceBusy(reply.get('retry_after', DEFAULTS['RETRY_AFTER']))
+    if error == 'superseded':
+        raise Superseded()
+    raise InferenceUnavailable(error)
+
+
+class _SuggestionHandler(socketserver.StreamRequestHandler):
+    """One JSON object per line in, one JSON object per line out."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            message = json.loads(line)
+            if message.get('ping'):
+                # the server only listens once its model is loaded
+                self.wfile.write(json.dumps({'ready': True}).encode() + b"\n")
+                return
+            future = self.server.batcher.submit(
+                message.get('description', ''),
+                key=message.get('key'),
+                session=message.get('session'),
+                seq=message.get('seq'),
+            )
+            reply = {'suggestions': future.result(timeout=self.server.request_timeout)}
+        except Exception as exc:
+            reply = _error_reply(exc)
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class SuggestionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, batcher, request_timeout=30.0):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.batcher = batcher
+        self.request_timeout = request_timeout
+        super().__init__(socket_path, _SuggestionHandler)
+
+
+def _send(message, socket_path, timeout):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(message).encode() + b"\n")
+            with sock.makefile('rb') as stream:
+                line = stream.readline()
+    except OSError as exc:
+        raise InferenceUnavailable(str(exc)) from exc
+
+    try:
+        reply = json.loads(line)
+    except ValueError as exc:
+        raise InferenceUnavailable("malformed reply") from exc
+    if 'error' in reply:
+        _raise_for_reply(reply)
+    return reply
+
+
+def request_suggestions(description, socket_path, timeout, key=None, session=None, seq=None):
+    """Ask the suggestion server for labels; raise InferenceUnavailable on any failure."""
+    message = {'description': description, 'key': key, 'session': session, 'seq': seq}
+    return _send(message, socket_path, timeout).get('suggestions', [])
+
+
+def ping(socket_path, timeout):
+    _send({'ping': True}, socket_path, timeout)
+
+
+PRELOAD_STRATEGIES = ('lazy', 'boot', 'prefork')
+
+_local_engine = None
+_local_batcher = None
+_local_lock = threading.Lock()
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def get_local_engine():
+    """The process-wide engine, loaded (and its load time/memory logged) on first use."""
+    global _local_engine
+    with _local_lock:
+        if _local_engine is None:
+            rss_before = _rss_mb()
+            started = time.perf_counter()
+            _local_engine = load_engine()
+            logger.info(
+                "Loaded %s suggestion engine in %.1fs (pid %d, RSS %.0f MB, +%.0f MB)",
+                get_config()['ENGINE'], time.perf_counter() - started, os.getpid(),
+                _rss_mb(), _rss_mb() - rss_before,
+            )
+    return _local_engine
+
+
+def warm_up(engine):
+    """One throwaway inference so the first citizen doesn't pay for lazy kernel/label setup."""
+    started = time.perf_counter()
+    classify_batch(engine, ["Garbage has not been collected for a week"])
+    logger.info("Suggestion warm-up took %.2fs (pid %d)", time.perf_counter() - started, os.getpid())
+
+
+def preload(phase):
+    """
+    Load the model according to ``SUGGESTION_INFERENCE['PRELOAD']``.
+
+    ``phase`` is ``'master'`` when called before gunicorn forks (``wsgi.py`` under
+    ``--preload``) and ``'worker'`` once a worker has booted. ``prefork`` loads in
+    the master so workers share the weights copy-on-write, but only warms up in
+    the workers: running inference before fork leaves torch's thread pool unusable
+    in the children. ``boot`` loads and warms up in each worker. ``lazy`` does
+    nothing and the first request loads the model.
+    """
+    config = get_config()
+    strategy = config['PRELOAD']
+    if strategy not in PRELOAD_STRATEGIES:
+        raise ValueError(f"Unknown PRELOAD strategy {strategy!r}; choose from {PRELOAD_STRATEGIES}")
+    if config['SOCKET_PATH'] or strategy == 'lazy':
+        return
+    if phase == 'master':
+        if strategy == 'prefork':
+            get_local_engine()
+    elif phase == 'worker':
+        warm_up(get_local_engine())
+
+
+def readiness():
+    """``(ready, details)`` for the readiness probe."""
+    config = get_config()
+    if config['SOCKET_PATH']:
+        try:
+            ping(config['SOCKET_PATH'], config['TIMEOUT'])
+        except InferenceUnavailable as exc:
+            return False, {'suggestion_service': str(exc)}
+        return True, {'suggestion_service': 'ready'}
+    loaded = _local_engine is not None
+    # a lazy worker is ready by design; preloading workers wait for the model
+    return loaded or config['PRELOAD'] == 'lazy', {'model_loaded': loaded, 'preload': config['PRELOAD']}
+
+
+def _local_run_batch(descriptions):
+    return classify_batch(get_local_engine(), descriptions)
+
+
+def _classify_locally(description, key=None, session=None, seq=None):
+    global _local_batcher
+    with _local_lock:
+        if _local_batcher is None:
+            _local_batcher = batcher_from_config(_local_run_batch).start()
+    future = _local_batcher.submit(description, key=key, session=session, seq=seq)
+    config = get_config()
+    # only a request that may be waiting for the model to load gets the long wait
+    timeout = config['TIMEOUT'] if _local_engine is not None else config['LOAD_TIMEOUT']
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        # the request stays queued; a retry that arrives before it runs joins it
+        raise InferenceBusy(config['RETRY_AFTER'])
+
+
+def suggest(description, key=None, session=None, seq=None):
+    """
+    Top complaint-type labels for ``description``.
+
+    ``key`` identifies identical requests for coalescing; ``session``/``seq`` let
+    a newer request from the same form supersede an older queued one.
+    """
+    config = get_config()
+    if not config['SOCKET_PATH']:
+        return _classify_locally(description, key, session, seq)
+    return request_suggestions(
+        description, config['SOCKET_PATH'], config['TIMEOUT'], key=key, session=session, seq=seq,
+    )
@@ -0,0 +1,91 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from grievance_api import classifiers, inference
+from grievance_api.models import Category, Grievance
+
+
+class Command(BaseCommand):
+    help = 'Store model-suggested categories on uncategorised / "Other" grievances, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows read and written per transaction')
+        parser.add_argument('--batch-size', type=int, default=16, help='Descriptions per model call')
+        parser.add_argument('--checkpoint', default=os.path.join(settings.BASE_DIR, '.cache', 'auto_classify.checkpoint'))
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--refresh', action='store_true', help='Re-classify grievances that already have a suggestion')
+        parser.add_argument('--follow', action='store_true',
+                            help='Keep running and pick up new or recategorised grievances without a suggestion')
+        parser.add_argument('--interval', type=int, default=60, help='Seconds between polls with --follow')
+
+    def handle(self, *args, **options):
+        try:
+            engine = inference.get_local_engine()
+        except inference.InferenceUnavailable as exc:
+            raise CommandError(str(exc))
+        labels = tuple(label for label in classifiers.candidate_labels() if label != "Other")
+        categories = Category.objects.in_bulk(labels, field_name='name')
+
+        unclassified = Grievance.objects.filter(Q(category__isnull=True) | Q(category__name="Other"))
+        pending = unclassified.filter(suggested_at__isnull=True)
+        queryset = unclassified if options['refresh'] else pending
+
+        last_id = 0 if options['restart'] else self._read_checkpoint(options['checkpoint'])
+        if last_id:
+            self.stdout.write(f"🔍 Resuming after grievance {last_id}")
+
+        total = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_id).order_by('pk').only('id', 'description')[:options['chunk_size']])
+            if not chunk:
+                if not options['follow']:
+                    break
+                # every poll rescans from the start: an older grievance moved to "Other" or
+                # uncategorised since sits below the cursor, still without a suggestion
+                self._clear_checkpoint(options['checkpoint'])
+                queryset, last_id = pending, 0
+                time.sleep(options['interval'])
+                continue
+
+            now = timezone.now()
+            for start in range(0, len(chunk), options['batch_size']):
+                batch = chunk[start:start + options['batch_size']]
+                ranked = engine.rank([g.description for g in batch], labels, k=1)
+                for grievance, [(label, confidence)] in zip(batch, ranked):
+                    grievance.suggested_category = categories.get(label)
+                    grievance.suggestion_confidence = confidence
+                    grievance.suggested_at = now
+
+            with transaction.atomic():
+                Grievance.objects.bulk_update(chunk, ['suggested_category', 'suggestion_confidence', 'suggested_at'])
+            last_id = chunk[-1].pk
+            self._write_checkpoint(options['checkpoint'], last_id)
+            total += len(chunk)
+            self.stdout.write(f"✅ Classified {total} grievances (up to id {last_id})")
+
+        # a finished pass needs no resume point
+        self._clear_checkpoint(options['checkpoint'])
+        self.stdout.write(self.style.SUCCESS(f'🚀 Suggested categories for {total} grievances'))
+
+    def _read_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _clear_checkpoint(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _write_checkpoint(self, path, last_id):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(last_id))
+        os.replace(tmp_path, path)
@@ -1,34 +1,32 @@
 from django.core.management.base import BaseCommand
-from datetime import date
-from grievance_api.models import Grievance
+from django.utils import timezone
+from grievance_api import escalation
+
 
 class Command(BaseCommand):
     help = 'Auto-escalate SLA overdue grievances'
-    
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Grievances escalated per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be escalated')
+
     def handle(self, *args, **options):
-        today = date.today()
+        today = timezone.now().date()
         self.stdout.write(f"🔍 Today: {today}")
-        
-        # Find ALL overdue - simple Python logic
-        triage_all = Grievance.objects.filter(status='In Review')
-        triage_overdue = [g for g in triage_all if g.due_date and g.due_date.date() < today]
-        self.stdout.write(f"🔍 Triage total: {triage_all.count()}, overdue: {len(triage_overdue)}")
-        
-        for g in triage_overdue:
-            old_status = g.status
-            g.status = 'Pending Approval'
-            g.save()
-            self.stdout.write(self.style.WARNING(f"✅ {old_status}→Pending Approval: {g.id} {g.title}"))
-        
-        dept_all = Grievance.objects.filter(status='In Progress')
-        dept_overdue = [g for g in dept_all if g.due_date and g.due_date < today]
-        self.stdout.write(f"🔍 Dept total: {dept_all.count()}, overdue: {len(dept_overdue)}")
-        
-        for g in dept_overdue:
-            old_status = g.status
-            g.status = 'Policy Decision'
-            g.save()
-            self.stdout.write(self.style.ERROR(f"✅ {old_status}→Policy Decision: {g.id} {g.title}"))
-        
-        total = len(triage_overdue) + len(dept_overdue)
-        self.stdout.write(self.style.SUCCESS(f'🚀 Escalated {total} grievances'))
+
+        def report(from_status, to_status, total):
+            self.stdout.write(f"✅ {from_status}→{to_status}: {total} so far")
+
+        results = escalation.escalate(
+            batch_size=options['batch_size'], dry_run=options['dry_run'], today=today, on_batch=report,
+        )
+        for (from_status, to_status), count in results.items():
+            style = self.style.WARNING if from_status == 'In Review' else self.style.ERROR
+            verb = 'would move' if options['dry_run'] else 'moved'
+            self.stdout.write(style(f"🔍 {from_status}→{to_status}: {count} overdue {verb}"))
+
+        total = sum(results.values())
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'🚀 Dry run: {total} grievances would be escalated'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'🚀 Escalated {total} grievances'))
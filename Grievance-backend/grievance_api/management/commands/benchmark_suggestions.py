@@ -0,0 +1,78 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from grievance_api import classifiers
+from grievance_api.models import Grievance
+
+# (description, expected category) used when no categorised grievances exist yet
+SAMPLE_GRIEVANCES = [
+    ("Garbage has not been collected from our lane for a week", "Uncollected garbage"),
+    ("People keep dumping waste on the empty plot near the school", "Garbage dumping"),
+    ("Tap water is yellow and smells bad since yesterday", "Contaminated water supply"),
+    ("Too many mosquitoes near the stagnant pond", "Mosquitoes problems"),
+    ("The canteen food made several students sick", "Issues with food quality"),
+    ("Huge pothole on the main road causing accidents", "Pothole Repair"),
+    ("Streetlight outside house number 12 has not worked for days", "Streetlight Malfunction"),
+    ("Water pressure is very low in the mornings", "Low Water Pressure"),
+    ("Sewer line blocked and overflowing onto the street", "Blocked Sewers / Drainage"),
+    ("Storm drain is clogged and the road floods when it rains", "Stormwater Drain Issues"),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare latency and accuracy of complaint-type suggestion engines on labelled grievances'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engines', nargs='+', default=['pipeline', 'precomputed'],
+                            choices=sorted(classifiers.ENGINES))
+        parser.add_argument('--samples', type=int, default=50,
+                            help='Recent categorised grievances to use (built-in samples if none)')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--artifact', default=None,
+                            help='Artifact directory for the quantized engine')
+
+    def handle(self, *args, **options):
+        labels = classifiers.candidate_labels()
+        samples = list(
+            Grievance.objects
+            .filter(category__name__in=labels)
+            .order_by('-created_at')
+            .values_list('description', 'category__name')[:options['samples']]
+        ) or SAMPLE_GRIEVANCES
+        descriptions = [description for description, _ in samples]
+        expected = [category for _, category in samples]
+        self.stdout.write(f"🔍 {len(samples)} labelled grievances × {len(labels)} labels, {options['repeat']} rounds")
+
+        reference = None
+        for name in options['engines']:
+            started = time.perf_counter()
+            model_name = options['artifact'] if name == classifiers.QuantizedEngine.name else None
+            engine = classifiers.load_engine(name, model_name)
+            load_seconds = time.perf_counter() - started
+            engine.classify(descriptions[:1], labels)  # warm-up, not timed
+
+            timings = []
+            predictions = []
+            for _ in range(options['repeat']):
+                predictions = []
+                for description in descriptions:
+                    started = time.perf_counter()
+                    predictions.append(engine.classify([description], labels)[0])
+                    timings.append((time.perf_counter() - started) * 1000)
+
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            top1 = sum(p[:1] == [e] for p, e in zip(predictions, expected)) / len(samples)
+            top3 = sum(e in p for p, e in zip(predictions, expected)) / len(samples)
+            line = (
+                f"{name:<12} load {load_seconds:6.1f}s  "
+                f"mean {statistics.mean(timings):7.1f}ms  p50 {statistics.median(timings):7.1f}ms  p95 {p95:7.1f}ms  "
+                f"top-1 {top1:.0%}  top-3 {top3:.0%}"
+            )
+            if reference is None:
+                reference = predictions
+            else:
+                agree = sum(a[:1] == b[:1] for a, b in zip(reference, predictions)) / len(predictions)
+                line += f"  agrees with {options['engines'][0]} {agree:.0%}"
+            self.stdout.write(line)
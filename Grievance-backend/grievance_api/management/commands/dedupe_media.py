@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from grievance_api import storage
+
+
+class Command(BaseCommand):
+    help = 'Move media into the content-addressed store, recount blob references and delete orphaned files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Seconds a file must have existed before it can count as an orphan')
+
+    def handle(self, *args, **options):
+        report = storage.dedupe(dry_run=options['dry_run'], min_age=options['min_age'])
+        prefix = '🔍 Dry run: would have' if options['dry_run'] else '✅'
+        self.stdout.write(f"{prefix} moved {report['moved']} files into the store, "
+                          f"dropped {report['duplicates']} duplicate copies")
+        if report['missing']:
+            self.stdout.write(self.style.WARNING(f"⚠️ {report['missing']} referenced files are missing from MEDIA_ROOT"))
+        if not options['dry_run']:
+            self.stdout.write(f"✅ Recounted {report['recounted']} blobs")
+        reclaimed = report['reclaimed_bytes'] / (1024 * 1024)
+        verb = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        self.stdout.write(self.style.SUCCESS(f"🚀 {verb} {report['orphans']} orphaned files ({reclaimed:.1f} MB)"))
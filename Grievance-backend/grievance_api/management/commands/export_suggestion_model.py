@@ -0,0 +1,92 @@
+import json
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from grievance_api import classifiers
+
+
+class Command(BaseCommand):
+    help = 'Export the complaint classifier to an int8-quantized ONNX or TorchScript artifact'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=classifiers.MODEL_NAME,
+                            help='NLI model to export, e.g. a distilled MNLI model')
+        parser.add_argument('--format', choices=['onnx', 'torchscript'], default='onnx')
+        parser.add_argument('--output', default=classifiers.default_artifact_dir())
+        parser.add_argument('--compare', action='store_true',
+                            help='Benchmark the artifact against the full model afterwards')
+
+    def handle(self, *args, **options):
+        try:
+            import torch
+            from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        except ImportError as exc:
+            raise CommandError(f"Exporting needs torch and transformers: {exc}")
+
+        output = options['output']
+        os.makedirs(output, exist_ok=True)
+
+        self.stdout.write(f"🔍 Loading {options['model']}...")
+        tokenizer = AutoTokenizer.from_pretrained(options['model'])
+        model = AutoModelForSequenceClassification.from_pretrained(options['model'], torchscript=True).eval()
+        label2id = {k.lower(): v for k, v in model.config.label2id.items()}
+
+        example = tokenizer(
+            ["Garbage has not been collected"], [classifiers.HYPOTHESIS_TEMPLATE.format("Uncollected garbage")],
+            return_tensors='pt',
+        )
+        inputs = (example['input_ids'], example['attention_mask'])
+
+        if options['format'] == 'onnx':
+            filename = self._export_onnx(torch, model, inputs, output)
+        else:
+            filename = self._export_torchscript(torch, model, inputs, output)
+
+        tokenizer.save_pretrained(output)
+        metadata = {
+            'format': options['format'],
+            'file': filename,
+            'base_model': options['model'],
+            'entailment_id': next(v for k, v in label2id.items() if k.startswith('entail')),
+            'max_length': min(tokenizer.model_max_length, 1024),
+        }
+        with open(os.path.join(output, classifiers.ARTIFACT_METADATA), 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+        size_mb = os.path.getsize(os.path.join(output, filename)) / 1e6
+        self.stdout.write(self.style.SUCCESS(f"🚀 Wrote {filename} ({size_mb:.0f} MB) to {output}"))
+
+        if options['compare']:
+            call_command('benchmark_suggestions', engines=['precomputed', 'quantized'], artifact=output,
+                         stdout=self.stdout)
+
+    def _export_onnx(self, torch, model, inputs, output):
+        try:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+        except ImportError as exc:
+            raise CommandError(f"ONNX export needs onnx and onnxruntime (requirements-onnx.txt): {exc}")
+
+        fp32_path = os.path.join(output, 'model-fp32.onnx')
+        torch.onnx.export(
+            model, inputs, fp32_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'logits': {0: 'batch'},
+            },
+            opset_version=17,
+            dynamo=False,
+        )
+        quantize_dynamic(fp32_path, os.path.join(output, 'model-int8.onnx'), weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+        return 'model-int8.onnx'
+
+    def _export_torchscript(self, torch, model, inputs, output):
+        quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        with torch.inference_mode():
+            traced = torch.jit.trace(quantized, inputs, strict=False)
+        traced.save(os.path.join(output, 'model-int8.pt'))
+        return 'model-int8.pt'
@@ -0,0 +1,131 @@
+import os
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+SOURCE_ALIAS = 'sqlite_source'
+
+
+def add_sqlite_alias(alias, path):
+    """Register a SQLite file as an extra database alias at runtime and return its connection."""
+    configured = connections.configure_settings({
+        DEFAULT_DB_ALIAS: {'ENGINE': 'django.db.backends.dummy'},  # only there to satisfy validation
+        alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+    })
+    connections.settings[alias] = configured[alias]
+    return connections[alias]
+
+
+def copy_order(models):
+    """Models ordered so every foreign key points at a table that is already filled."""
+    remaining = {model._meta.label: model for model in models}
+    ordered = []
+    while remaining:
+        ready = [
+            label for label, model in remaining.items()
+            if not any(
+                field.related_model._meta.label in remaining and field.related_model is not model
+                for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model
+            )
+        ]
+        if not ready:  # a cycle; deferred constraints cover it on PostgreSQL
+            ready = list(remaining)[:1]
+        for label in sorted(ready):
+            ordered.append(remaining.pop(label))
+    return ordered
+
+
+@contextmanager
+def keep_timestamps(model):
+    """Stop auto_now/auto_now_add from overwriting the copied values."""
+    fields = [f for f in model._meta.concrete_fields if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Copy every table from the SQLite database into the configured (PostgreSQL) database, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=os.path.join(settings.BASE_DIR, 'db.sqlite3'))
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows read and written per transaction')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Target database alias')
+        parser.add_argument('--no-input', action='store_true', help="Don't ask before emptying the target")
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['source']):
+            raise CommandError(f"No SQLite database at {options['source']}")
+        target = options['database']
+        if connections[target].vendor == 'sqlite' and connections[target].settings_dict['NAME'] == options['source']:
+            raise CommandError("Source and target are the same database; set DATABASE_URL first")
+
+        source = add_sqlite_alias(SOURCE_ALIAS, options['source'])
+
+        self.stdout.write(f"🔍 Migrating the schema on '{target}'...")
+        call_command('migrate', database=target, verbosity=0)
+
+        source_tables = set(source.introspection.table_names())
+        models = [
+            model for model in apps.get_models(include_auto_created=True)
+            if model._meta.managed and not model._meta.proxy
+        ]
+        models = copy_order([m for m in models if m._meta.db_table in source_tables])
+
+        if not options['no_input']:
+            answer = input(f"This empties {len(models)} tables on '{target}' before copying. Continue? [y/N] ")
+            if answer.lower() != 'y':
+                raise CommandError("Cancelled")
+        self.flush(target, models)
+
+        for model in models:
+            with keep_timestamps(model):
+                copied = self.copy_model(model, target, options['batch_size'])
+            self.stdout.write(f"✅ {model._meta.label}: {copied} rows")
+
+        self.reset_sequences(target, models)
+        source.close()
+        self.stdout.write(self.style.SUCCESS(f"🚀 Copied {len(models)} tables from {options['source']}"))
+
+    def flush(self, target, models):
+        connection = connections[target]
+        tables = [model._meta.db_table for model in models]
+        statements = connection.ops.sql_flush(no_style(), tables, allow_cascade=True)
+        connection.ops.execute_sql_flush(statements)
+
+    def copy_model(self, model, target, batch_size):
+        # raw column values keyed by pk, so no save() hooks or signals run
+        queryset = model._base_manager.using(SOURCE_ALIAS).order_by('pk')
+        fields = [field.attname for field in model._meta.concrete_fields]
+        total = 0
+        last_pk = None
+        while True:
+            batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(batch.values_list(*fields)[:batch_size])
+            if not rows:
+                return total
+            with transaction.atomic(using=target):
+                model._base_manager.using(target).bulk_create(
+                    [model(**dict(zip(fields, row))) for row in rows], batch_size=batch_size,
+                )
+            total += len(rows)
+            last_pk = rows[-1][fields.index(model._meta.pk.attname)]
+
+    def reset_sequences(self, target, models):
+        connection = connections[target]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
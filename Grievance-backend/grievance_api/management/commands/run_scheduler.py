@@ -0,0 +1,37 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from grievance_api import scheduler
+
+
+class Command(BaseCommand):
+    help = 'Run SLA escalation, stats refresh and cleanup on their intervals (one leader across nodes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one tick and exit')
+
+    def handle(self, *args, **options):
+        runner = scheduler.Scheduler()
+        intervals = ', '.join(
+            f"{name} every {runner.config['JOBS'][name]}s" for name in runner.jobs
+        )
+        self.stdout.write(f"🔍 Scheduler {runner.node}: {intervals}")
+
+        if options['once']:
+            if not runner.acquire_lease():
+                self.stdout.write(self.style.WARNING("⏳ Another node holds the scheduler lease"))
+                return
+            try:
+                for job in runner.tick():
+                    self.stdout.write(f"✅ {job.name}: {job.last_status} in {job.last_duration_ms}ms")
+            finally:
+                runner.release_lease()
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        self.stdout.write(self.style.SUCCESS("🚀 Scheduler running"))
+        runner.run_forever(stop)
+        self.stdout.write("👋 Scheduler stopped, lease released")
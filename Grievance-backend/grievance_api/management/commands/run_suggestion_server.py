@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from grievance_api import inference
+
+
+class Command(BaseCommand):
+    help = 'Serve complaint-type suggestions from one shared, micro-batched model over a Unix socket'
+
+    def add_arguments(self, parser):
+        config = inference.get_config()
+        parser.add_argument('--socket', default=config['SOCKET_PATH'] or '/tmp/grievance-suggest.sock')
+        parser.add_argument('--max-batch-size', type=int, default=config['MAX_BATCH_SIZE'])
+        parser.add_argument('--max-wait-ms', type=float, default=config['MAX_WAIT_MS'])
+        parser.add_argument('--max-queue', type=int, default=config['MAX_QUEUE'],
+                            help='Pending requests before new ones are refused with a retry hint')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"🔍 Loading the {inference.get_config()['ENGINE']} suggestion engine...")
+        engine = inference.get_local_engine()
+        inference.warm_up(engine)
+
+        batcher = inference.MicroBatcher(
+            lambda descriptions: inference.classify_batch(engine, descriptions),
+            max_batch_size=options['max_batch_size'],
+            max_wait=options['max_wait_ms'] / 1000.0,
+            max_queue=options['max_queue'],
+            retry_after=inference.get_config()['RETRY_AFTER'],
+        ).start()
+
+        server = inference.SuggestionServer(options['socket'], batcher)
+        self.stdout.write(self.style.SUCCESS(
+            f"🚀 Listening on {options['socket']} "
+            f"(batch ≤ {batcher.max_batch_size}, wait ≤ {options['max_wait_ms']}ms)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
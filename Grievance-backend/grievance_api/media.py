@@ -0,0 +1,206 @@
+"""
+Serving uploaded media.
+
+Everything under ``MEDIA_URL`` goes through ``MediaView``, in DEBUG and in
+production alike. A request is allowed when it carries a signature minted by
+the API serializers (``signed_url``) or comes from a user who may see a
+grievance the file belongs to: the owner, staff (as in ``IsOwnerOrAdmin``), or
+a role holder whose dashboard lists it. ``<img>`` tags cannot send the token
+header, so the dashboards rely on signed URLs. Expiry is rounded up to
+``URL_WINDOW``, so a photo keeps the same URL for a while and browsers can
+cache it.
+
+Responses carry a strong ETag (blobs are named by their SHA-256, see
+``storage.py``), answer ``If-None-Match`` with 304, and serve single byte
+ranges. The bytes themselves go out by ``X-Accel-Redirect`` (nginx) or
+``X-Sendfile`` (Apache) when ``OFFLOAD`` is set. Otherwise a ``FileResponse``
+is used, which gunicorn sends with ``sendfile()``.
+"""
+import mimetypes
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, parse_etags, quote_etag
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied
+from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+
+from . import storage
+from .models import FILE_FIELDS, Grievance
+from .permissions import visible_grievances
+
+DEFAULTS = {
+    'OFFLOAD': None,  # None, 'x-accel-redirect' or 'x-sendfile'
+    'ACCEL_PREFIX': '/protected-media/',  # nginx `internal` location aliased to MEDIA_ROOT
+    'URL_TTL': 6 * 3600,  # seconds a signed URL stays valid, at least
+    'URL_WINDOW': 3600,  # expiry is rounded up to this, so URLs stay stable
+    'MAX_AGE': 3600,  # browser cache lifetime for files that can change
+}
+
+SIGNING_SALT = 'grievance_api.media'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'MEDIA_SERVING', {})}
+
+
+def _signature(name, expires):
+    return signing.Signer(salt=SIGNING_SALT).signature(f'{name}:{expires}')
+
+
+def signed_url(file, request=None):
+    """The URL of a stored file with an access signature, absolute when ``request`` is given."""
+    if not file or not hasattr(file, 'url'):
+        return None
+    config = get_config()
+    window = config['URL_WINDOW']
+    expires = (int(time.time()) + config['URL_TTL'] + window) // window * window
+    url = f'{file.url}?expires={expires}&sig={_signature(file.name, expires)}'
+    return request.build_absolute_uri(url) if request else url
+
+
+def has_valid_signature(request, name):
+    try:
+        expires = int(request.GET.get('expires', ''))
+    except ValueError:
+        return False
+    return expires > time.time() and constant_time_compare(request.GET.get('sig', ''), _signature(name, expires))
+
+
+def grievances_with(name):
+    """Grievances that ``name`` belongs to, as one of their files or a photo rendition."""
+    lookups = Q()
+    for field in FILE_FIELDS:
+        lookups |= Q(**{field: name})
+    for field in ('image', 'medium', 'thumbnail'):
+        lookups |= Q(**{f'images__{field}': name})
+    return Grievance.objects.filter(lookups)
+
+
+def can_view(user, name):
+    grievances = grievances_with(name)
+    if user.is_staff:
+        return grievances.exists()
+    return grievances.filter(Q(user=user) | Q(pk__in=visible_grievances(user).values('pk'))).exists()
+
+
+def etag_for(name, stat):
+    if storage.is_blob(name):
+        return quote_etag(os.path.splitext(os.path.basename(name))[0])  # the content digest
+    return quote_etag(f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single byte range, None to send everything, or 'invalid'."""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None  # multiple ranges or junk: the whole file is a valid answer
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'invalid'
+    return start, end
+
+
+class _Slice:
+    """A byte range of an open file; gunicorn still sends it with sendfile() through fileno()."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class MediaView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, name):
+        name = name.lstrip('/')
+        if not has_valid_signature(request, name):
+            if not request.user.is_authenticated:
+                raise NotAuthenticated()
+            if not can_view(request.user, name):
+                raise PermissionDenied()
+
+        try:
+            path = default_storage.path(name)
+            stat = os.stat(path)
+        except (OSError, SuspiciousFileOperation):  # missing, or a path escaping MEDIA_ROOT
+            raise Http404()
+
+        config = get_config()
+        etag = etag_for(name, stat)
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(stat.st_mtime),
+            'Accept-Ranges': 'bytes',
+            # blobs never change under their name
+            'Cache-Control': 'private, max-age=31536000, immutable' if storage.is_blob(name)
+            else f"private, max-age={config['MAX_AGE']}",
+        }
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+            response = HttpResponseNotModified()
+            for header in ('ETag', 'Cache-Control', 'Last-Modified'):
+                response[header] = headers[header]
+            return response
+
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if config['OFFLOAD']:
+            # the web server answers Range itself and copies the file without us
+            response = HttpResponse(content_type=content_type)
+            if config['OFFLOAD'] == 'x-sendfile':
+                response['X-Sendfile'] = path
+            else:
+                response['X-Accel-Redirect'] = config['ACCEL_PREFIX'] + name
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        byte_range = None
+        if 'Range' in request.headers and request.headers.get('If-Range', etag) == etag:
+            byte_range = parse_range(request.headers['Range'], stat.st_size)
+        if byte_range == 'invalid':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+        file = open(path, 'rb')
+        if byte_range:
+            start, end = byte_range
+            response = FileResponse(_Slice(file, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(file, content_type=content_type)
+        for header, value in headers.items():
+            response[header] = value
+        return response
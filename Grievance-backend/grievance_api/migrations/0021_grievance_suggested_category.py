@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 04:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievance_api', '0020_alter_grievance_department'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grievance',
+            name='suggested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='grievance',
+            name='suggested_category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='suggested_grievances', to='grievance_api.category'),
+        ),
+        migrations.AddField(
+            model_name='grievance',
+            name='suggestion_confidence',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
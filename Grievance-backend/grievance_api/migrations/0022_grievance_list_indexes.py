@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-18 04:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievance_api', '0021_grievance_suggested_category'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['-created_at', '-id'], name='grievance_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['status'], name='grievance_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['due_date'], name='grievance_due_date_idx'),
+        ),
+    ]
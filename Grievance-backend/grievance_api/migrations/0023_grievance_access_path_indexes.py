@@ -0,0 +1,50 @@
+# Generated by Django 5.2.9 on 2026-10-18 04:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievance_api', '0022_grievance_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='grievance',
+            name='grievance_status_idx',
+        ),
+        migrations.AlterField(
+            model_name='grievance',
+            name='department',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='grievance_api.department'),
+        ),
+        migrations.AlterField(
+            model_name='grievance',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='grievances', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='grievance_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['department', '-created_at', '-id'], name='grievance_dept_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['category', 'status', '-created_at'], name='grievance_triage_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['status', 'due_date'], name='grievance_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(condition=models.Q(('status__in', ['Pending', 'In Review', 'Pending Approval', 'In Progress', 'Policy Decision'])), fields=['due_date'], name='grievance_open_due_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-18 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grievance_api', '0024_scheduler'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grievanceimage',
+            name='medium',
+            field=models.ImageField(blank=True, upload_to='grievance_images/medium/'),
+        ),
+        migrations.AddField(
+            model_name='grievanceimage',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='grievanceimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='grievance_images/thumbnails/'),
+        ),
+    ]
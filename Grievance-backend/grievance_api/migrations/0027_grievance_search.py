@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from grievance_api import search
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from grievance_api import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    """
+    Full-text index over grievances: an FTS5 table with triggers on SQLite, a
+    generated tsvector column with a GIN index on PostgreSQL (see search.py).
+    Adding the column rewrites the grievance table on PostgreSQL.
+    """
+
+    dependencies = [
+        ('grievance_api', '0026_media_blob'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
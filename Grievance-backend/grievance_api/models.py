@@ -1,8 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.cache import caches
 from django.utils import timezone
 from datetime import timedelta
 
+from . import images
+
 class Department(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
@@ -11,6 +14,27 @@ class Department(models.Model):
     def __str__(self):
         return self.name
 
+
+SLA_TABLE_CACHE_KEY = 'department-sla-days'
+
+
+def department_sla_days(refresh=False):
+    """
+    ``{department_id: sla_days}`` for every department, kept in the shared cache
+    so saving a grievance never has to load its department. ``signals.py``
+    drops the table whenever a Department changes.
+    """
+    cache = caches['shared']
+    table = None if refresh else cache.get(SLA_TABLE_CACHE_KEY)
+    if table is None:
+        table = dict(Department.objects.values_list('pk', 'sla_days'))
+        cache.set(SLA_TABLE_CACHE_KEY, table, timeout=3600)
+    return table
+
+
+def clear_department_sla_days():
+    caches['shared'].delete(SLA_TABLE_CACHE_KEY)
+
 class SubDepartment(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
@@ -38,6 +62,32 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = "Categories"
 
+class GrievanceQuerySet(models.QuerySet):
+    def with_related(self):
+        """Load everything GrievanceSerializer reads, so lists serialize in a fixed number of queries."""
+        return (
+            self.select_related('user', 'category', 'department', 'suggested_category')
+            .prefetch_related('images')
+        )
+
+
+# Statuses a grievance can still move out of; the rest are final
+OPEN_STATUSES = ['Pending', 'In Review', 'Pending Approval', 'In Progress', 'Policy Decision']
+CLOSED_STATUSES = ['Resolved', 'Rejected']
+
+# Days allowed in each stage when the grievance has no department SLA
+STATUS_SLA_DAYS = {
+    'In Review': 7,          # Triage
+    'Pending Approval': 3,   # TopAuth
+    'In Progress': 7,        # Dept (+14d extension)
+    'Policy Decision': 5,    # TopAuth review
+}
+
+
+# Grievance file fields; Grievance.save releases a file once it is replaced
+FILE_FIELDS = ('signed_document', 'resolution_image', 'grievance_image')
+
+
 class Grievance(models.Model):
     STATUS_CHOICES = [
         ('Pending', 'Pending'),
@@ -48,7 +98,8 @@ class Grievance(models.Model):
         ('Resolved', 'Resolved'),
         ('Rejected', 'Rejected'),
     ]
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grievances')
+    # user/department lead the composite list indexes below, which cover the FK lookups
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grievances', db_index=False)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='category_grievances')
     other_category = models.CharField(max_length=200, blank=True, null=True)
     title = models.CharField(max_length=200)
@@ -61,16 +112,69 @@ class Grievance(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     location = models.CharField(max_length=255, blank=True, null=True)
     grievance_image = models.ImageField(upload_to='grievance_images/', null=True, blank=True)
-    department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True)
+    department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True, db_index=False)
     due_date = models.DateField(null=True, blank=True)  # ✅ DateField safe
+    # model-suggested category for triage, filled in bulk by `manage.py auto_classify`
+    suggested_category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='suggested_grievances')
+    suggestion_confidence = models.FloatField(null=True, blank=True)
+    suggested_at = models.DateTimeField(null=True, blank=True)
+
+    objects = GrievanceQuerySet.as_manager()
+
+    class Meta:
+        # one index per hot access path; tests.QueryPlanTests checks each is used
+        indexes = [
+            # keyset pagination order (see pagination.KeysetPagination)
+            models.Index(fields=['-created_at', '-id'], name='grievance_created_id_idx'),
+            # citizen "my grievances" and department-admin lists, newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='grievance_user_created_idx'),
+            models.Index(fields=['department', '-created_at', '-id'], name='grievance_dept_created_idx'),
+            # triage queue: category "Other" + status "In Review", newest first
+            models.Index(fields=['category', 'status', '-created_at'], name='grievance_triage_idx'),
+            # auto_escalate and per-status counts: one status, due_date range
+            models.Index(fields=['status', 'due_date'], name='grievance_status_due_idx'),
+            # SLA health buckets over all grievances
+            models.Index(fields=['due_date'], name='grievance_due_date_idx'),
+            # overdue filter: open grievances by due_date, closed ones never indexed
+            models.Index(
+                fields=['due_date'], name='grievance_open_due_idx',
+                condition=models.Q(status__in=OPEN_STATUSES),
+            ),
+        ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored status so save() can spot a change without re-reading it
+        if 'status' in field_names:
+            instance._loaded_status = instance.status
+        # and the stored files, so a replaced one can be released
+        instance._loaded_files = {
+            field: getattr(instance, field).name for field in FILE_FIELDS if field in field_names
+        }
+        return instance
+
+    def stage_sla_days(self):
+        """Days allowed in the current stage: the department's SLA, else the stage default."""
+        if self.department_id:
+            table = department_sla_days()
+            if self.department_id not in table:
+                table = department_sla_days(refresh=True)
+            if self.department_id in table:
+                return table[self.department_id]
+        return STATUS_SLA_DAYS.get(self.status)
+
     def save(self, *args, **kwargs):
         now_date = timezone.now().date()
 
         # detect status change (only if already exists)
         old_status = None
-        if self.pk:
-            old_status = Grievance.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+        if self.pk and not self._state.adding:
+            if hasattr(self, '_loaded_status'):
+                old_status = self._loaded_status
+            else:
+                # built by hand or loaded with status deferred
+                old_status = Grievance.objects.filter(pk=self.pk).values_list('status', flat=True).first()
 
         status_changed = (old_status is not None and old_status != self.status)
 
@@ -78,22 +182,32 @@ class Grievance(models.Model):
         if status_changed:
             self.due_date = None
 
-        # then your existing SLA logic can run
-        if self.department and not self.due_date:
-            self.due_date = now_date + timedelta(days=self.department.sla_days)
-
         if not self.due_date:
-            if self.status == 'In Review':
-                self.due_date = now_date + timedelta(days=7)
-            elif self.status == 'Pending Approval':
-                self.due_date = now_date + timedelta(days=3)
-            elif self.status == 'In Progress':
-                self.due_date = now_date + timedelta(days=7)
-            elif self.status == 'Policy Decision':
-                self.due_date = now_date + timedelta(days=5)
+            sla_days = self.stage_sla_days()
+            if sla_days is not None:
+                self.due_date = now_date + timedelta(days=sla_days)
+
+        # new photo uploads are stored re-encoded and stripped of EXIF
+        for field in ('grievance_image', 'resolution_image'):
+            upload = getattr(self, field)
+            if upload and not upload._committed:
+                setattr(self, field, images.normalise(upload) or upload)
 
         super().save(*args, **kwargs)
 
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'status' in update_fields:
+            self._loaded_status = self.status
+
+        loaded_files = getattr(self, '_loaded_files', {})
+        for field in FILE_FIELDS:
+            if update_fields is not None and field not in update_fields:
+                continue
+            current = getattr(self, field)
+            if loaded_files.get(field) and loaded_files[field] != current.name:
+                current.storage.delete(loaded_files[field])
+            loaded_files[field] = current.name
+        self._loaded_files = loaded_files
 
 
 # GrievanceEvent/GrievanceImage unchanged...
@@ -111,3 +225,57 @@ class GrievanceImage(models.Model):
     grievance = models.ForeignKey(Grievance, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='grievance_images/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # renditions written by images.process(); empty until then, or if the upload wasn't an image
+    medium = models.ImageField(upload_to='grievance_images/medium/', blank=True)
+    thumbnail = models.ImageField(upload_to='grievance_images/thumbnails/', blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def prepare(self):
+        """Process a fresh upload before it ever reaches storage; bulk_create callers call this themselves."""
+        if self.image and not self.image._committed and self.processed_at is None \
+                and images.get_config()['PROCESS_ON_UPLOAD']:
+            images.process(self)
+
+    def save(self, *args, **kwargs):
+        self.prepare()
+        super().save(*args, **kwargs)
+
+
+class MediaBlob(models.Model):
+    """A file in the content-addressed media store, with how many file fields use it (see storage.py)."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class SchedulerLease(models.Model):
+    """One row per scheduler; whoever holds an unexpired lease runs the periodic jobs."""
+    name = models.CharField(max_length=50, unique=True)
+    holder = models.CharField(max_length=200, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} held by {self.holder or 'nobody'}"
+
+
+class ScheduledJob(models.Model):
+    """Schedule and last-run status of a periodic job (see scheduler.py)."""
+    name = models.CharField(max_length=50, unique=True)
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    last_duration_ms = models.FloatField(null=True, blank=True)
+    last_status = models.CharField(max_length=10, blank=True)  # 'ok' | 'failed'
+    last_error = models.TextField(blank=True)
+    last_result = models.JSONField(blank=True, null=True)
+    last_node = models.CharField(max_length=200, blank=True)
+    run_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0)
+    consecutive_failures = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.last_status or 'never run'})"
@@ -0,0 +1,81 @@
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over ``(created_at, id)``, newest first.
+
+    Each page is one indexed range scan no matter how deep the client goes,
+    unlike OFFSET paging. Paging is opt-in: it applies when the client sends
+    ``page_size`` or ``cursor``, so screens that still expect a plain list keep
+    working.
+    """
+    page_size = 50
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if 'cursor' not in params and 'page_size' not in params:
+            return None
+
+        self.request = request
+        self.size = self._page_size(params.get('page_size'))
+        rows = list(self.seek(queryset, params.get('cursor'))[:self.size + 1])
+        self.next_cursor = self._encode(rows[self.size - 1]) if len(rows) > self.size else None
+        return rows[:self.size]
+
+    def seek(self, queryset, cursor=None):
+        """``queryset`` in page order, starting after ``cursor``."""
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            created_at, pk = self._decode(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        return queryset
+
+    def get_paginated_response(self, data):
+        return Response({'next': self._next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def _page_size(self, value):
+        try:
+            return max(1, min(int(value), self.max_page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+
+    def _encode(self, obj):
+        raw = f'{obj.created_at.isoformat()}|{obj.pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def _decode(self, cursor):
+        try:
+            created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor')
+        if created_at is None:
+            raise NotFound('Invalid cursor')
+        return created_at, pk
+
+    def _next_link(self):
+        if not self.next_cursor:
+            return None
+        params = self.request.query_params.copy()
+        params['cursor'] = self.next_cursor
+        params['page_size'] = self.size
+        return self.request.build_absolute_uri(f'{self.request.path}?{params.urlencode()}')
@@ -1,5 +1,33 @@
 from rest_framework import permissions
 
+from . import roles
+from .models import Grievance
+
+
+def visible_grievances(user):
+    """The grievances ``user``'s roles let them see, as in ``GrievanceViewSet``."""
+    user_roles = roles.for_user(user)
+    if user_roles.is_top_authority:
+        return Grievance.objects.all()
+
+    if user_roles.is_department_admin:
+        if not user_roles.department_ids:
+            return Grievance.objects.none()
+        return Grievance.objects.filter(department_id__in=user_roles.department_ids)
+
+    if user_roles.is_triage:
+        return (
+            Grievance.objects
+            .filter(category__name="Other", status="In Review")
+            .order_by('-created_at')
+        )
+
+    if user.is_staff:
+        return Grievance.objects.all()
+
+    return Grievance.objects.filter(user=user).order_by('-created_at')
+
+
 class IsAdminUser(permissions.BasePermission):
     """
     Custom permission to allow only users who are superusers or belong to admin groups.
@@ -10,10 +38,9 @@ class IsAdminUser(permissions.BasePermission):
             return False
 
         # Check superuser or membership in designated admin groups
-        admin_groups = ['Super Administrator', 'Triage Officer', 'Department Head']
         is_admin = (
             request.user.is_superuser or
-            request.user.groups.filter(name__in=admin_groups).exists()
+            roles.for_user(request.user).has(*roles.ADMIN_GROUPS)
         )
 
         return is_admin
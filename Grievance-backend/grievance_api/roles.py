@@ -0,0 +1,88 @@
+"""
+Who a user is, resolved once.
+
+Permission classes and querysets ask ``roles.for_user(user)`` instead of
+querying ``user.groups`` themselves. The answer (group names plus the ids of
+departments the user administers) is memoised on the user object for the
+rest of the request, and kept in the shared cache between requests. Any
+change to group membership, a group, or a department's admin bumps a version
+number and so invalidates every cached entry (see ``signals.py``).
+"""
+import time
+
+from django.core.cache import caches
+
+from .models import Department
+
+TOP_AUTHORITY = 'TOP_AUTHORITY'
+DEPARTMENT_ADMIN = 'DEPARTMENT_ADMIN'
+TRIAGE_USER = 'TRIAGE_USER'
+# groups allowed through permissions.IsAdminUser
+ADMIN_GROUPS = ('Super Administrator', 'Triage Officer', 'Department Head')
+
+CACHE_ALIAS = 'shared'
+CACHE_TTL = 300  # seconds
+VERSION_KEY = 'roles:version'
+
+
+class Roles:
+    def __init__(self, group_names, department_ids):
+        self.group_names = frozenset(group_names)
+        self.department_ids = frozenset(department_ids)
+
+    def has(self, *names):
+        return not self.group_names.isdisjoint(names)
+
+    @property
+    def is_top_authority(self):
+        return TOP_AUTHORITY in self.group_names
+
+    @property
+    def is_department_admin(self):
+        return DEPARTMENT_ADMIN in self.group_names
+
+    @property
+    def is_triage(self):
+        return TRIAGE_USER in self.group_names
+
+
+NO_ROLES = Roles((), ())
+
+
+def version():
+    cache = caches[CACHE_ALIAS]
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def invalidate():
+    caches[CACHE_ALIAS].set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def load(user):
+    return Roles(
+        user.groups.values_list('name', flat=True),
+        Department.objects.filter(admin=user).values_list('pk', flat=True),
+    )
+
+
+def for_user(user):
+    if not user or not user.is_authenticated:
+        return NO_ROLES
+    roles = getattr(user, '_grievance_roles', None)
+    if roles is not None:
+        return roles
+
+    cache = caches[CACHE_ALIAS]
+    key = f'roles:{version()}:{user.pk}'
+    cached = cache.get(key)
+    if cached is not None:
+        roles = Roles(*cached)
+    else:
+        roles = load(user)
+        cache.set(key, (sorted(roles.group_names), sorted(roles.department_ids)), timeout=CACHE_TTL)
+    user._grievance_roles = roles
+    return roles
@@ -0,0 +1,249 @@
+"""
+In-process periodic jobs, run by ``manage.py run_scheduler``.
+
+Any number of scheduler processes may run; they share one ``SchedulerLease``
+row and only the holder of the unexpired lease runs jobs. The lease is taken
+and renewed with a single conditional UPDATE, so two nodes can never both
+believe they lead. If the leader dies, another node takes over once the
+lease expires. While a job runs, a heartbeat thread keeps renewing the lease,
+so a job may take longer than ``LEASE_SECONDS``. If a renewal finds the lease
+taken, the running job is left to finish (jobs can't be interrupted safely),
+but no further job starts on this node.
+
+Each job's schedule and last result live in a ``ScheduledJob`` row, so a new
+leader carries on where the old one stopped and ``/api/scheduler/status/`` can
+report timings from any web worker. Intervals get a random jitter, so jobs
+started together drift apart. A failing job backs off exponentially, up to
+``MAX_BACKOFF``.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from . import escalation, images, stats
+from .models import ScheduledJob, SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'LEASE_NAME': 'default',
+    'LEASE_SECONDS': 60,
+    'TICK_SECONDS': 5,
+    'JITTER': 0.1,  # +/- fraction of the interval
+    'MAX_BACKOFF': 3600,  # seconds
+    'JOBS': {  # seconds between runs; 0 disables a job
+        'escalate': 300,
+        'refresh_stats': 25,
+        'cleanup': 86400,
+        'process_images': 60,
+    },
+}
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, 'SCHEDULER', {})}
+    config['JOBS'] = {**DEFAULTS['JOBS'], **config['JOBS']}
+    return config
+
+
+def run_escalation():
+    results = escalation.escalate()
+    return {f'{from_status} -> {to_status}': count for (from_status, to_status), count in results.items()}
+
+
+def run_stats_refresh():
+    return {'as_of': stats.refresh()['as_of']}
+
+
+def run_cleanup():
+    call_command('clearsessions')
+    return {'sessions': 'cleared'}
+
+
+def run_image_processing():
+    return {'processed': images.process_pending()}
+
+
+JOBS = {
+    'escalate': run_escalation,
+    'refresh_stats': run_stats_refresh,
+    'cleanup': run_cleanup,
+    'process_images': run_image_processing,
+}
+
+
+def node_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class _Heartbeat:
+    """Renews the lease every third of ``LEASE_SECONDS`` until the ``with`` block ends."""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.lost = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='scheduler-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._done.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while not self._done.wait(self.scheduler.config['LEASE_SECONDS'] / 3):
+                try:
+                    renewed = self.scheduler.acquire_lease()
+                except Exception:
+                    # database hiccup: the lease is still ours until it expires, try again
+                    logger.exception("Could not renew the scheduler lease")
+                    continue
+                if not renewed:
+                    logger.error("Scheduler lease taken by another node while a job ran")
+                    self.lost.set()
+                    return
+        finally:
+            connection.close()  # this thread's own connection
+
+
+class Scheduler:
+    def __init__(self, jobs=None, config=None, node=None):
+        self.config = config or get_config()
+        self.jobs = {
+            name: func for name, func in (jobs or JOBS).items()
+            if self.config['JOBS'].get(name)
+        }
+        self.node = node or node_id()
+
+    def acquire_lease(self):
+        """Take or renew the lease; True if this node now leads."""
+        now = timezone.now()
+        name = self.config['LEASE_NAME']
+        SchedulerLease.objects.get_or_create(name=name)
+        taken = (
+            SchedulerLease.objects
+            .filter(name=name)
+            .filter(Q(holder=self.node) | Q(holder='') | Q(expires_at__isnull=True) | Q(expires_at__lt=now))
+            .update(holder=self.node, expires_at=now + timedelta(seconds=self.config['LEASE_SECONDS']))
+        )
+        return taken == 1
+
+    def release_lease(self):
+        SchedulerLease.objects.filter(name=self.config['LEASE_NAME'], holder=self.node).update(
+            holder='', expires_at=None,
+        )
+
+    def delay(self, name, consecutive_failures):
+        """Seconds until the next run: the interval with jitter, doubled per consecutive failure."""
+        interval = self.config['JOBS'][name]
+        if consecutive_failures:
+            return min(interval * 2 ** consecutive_failures, max(self.config['MAX_BACKOFF'], interval))
+        jitter = self.config['JITTER']
+        return interval * random.uniform(1 - jitter, 1 + jitter)
+
+    def due_jobs(self):
+        now = timezone.now()
+        for name in self.jobs:
+            ScheduledJob.objects.get_or_create(name=name)
+        return list(
+            ScheduledJob.objects
+            .filter(name__in=self.jobs)
+            .filter(Q(next_run_at__isnull=True) | Q(next_run_at__lte=now))
+            .order_by('next_run_at')
+        )
+
+    def run_job(self, job):
+        job.last_started_at = timezone.now()
+        started = time.perf_counter()
+        try:
+            job.last_result = self.jobs[job.name]()
+        except Exception:
+            job.last_status = 'failed'
+            job.last_error = traceback.format_exc(limit=5)
+            job.failure_count += 1
+            job.consecutive_failures += 1
+            logger.exception("Scheduled job %s failed", job.name)
+        else:
+            job.last_status = 'ok'
+            job.last_error = ''
+            job.consecutive_failures = 0
+        job.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        job.last_finished_at = timezone.now()
+        job.last_node = self.node
+        job.run_count += 1
+        job.next_run_at = job.last_finished_at + timedelta(seconds=self.delay(job.name, job.consecutive_failures))
+        job.save()
+        logger.info("Scheduled job %s %s in %.1fms", job.name, job.last_status, job.last_duration_ms)
+        return job
+
+    def tick(self):
+        """Run whatever is due if this node leads; returns the jobs that ran."""
+        if not self.acquire_lease():
+            return []
+        ran = []
+        for job in self.due_jobs():
+            if not self.acquire_lease():
+                break
+            with _Heartbeat(self) as heartbeat:
+                ran.append(self.run_job(job))
+            if heartbeat.lost.is_set():
+                break
+        return ran
+
+    def run_forever(self, stop=None):
+        stop = stop or threading.Event()
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    self.tick()
+                except Exception:
+                    # database hiccup: keep the loop alive and try again next tick
+                    logger.exception("Scheduler tick failed")
+                stop.wait(self.config['TICK_SECONDS'])
+        finally:
+            self.release_lease()
+
+
+def status():
+    config = get_config()
+    lease = SchedulerLease.objects.filter(name=config['LEASE_NAME']).first()
+    now = timezone.now()
+    leader = lease.holder if lease and lease.expires_at and lease.expires_at > now else None
+    return {
+        'leader': leader,
+        'lease_expires_at': lease.expires_at if leader else None,
+        'jobs': [
+            {
+                'name': job.name,
+                'interval': config['JOBS'].get(job.name),
+                'next_run_at': job.next_run_at,
+                'last_started_at': job.last_started_at,
+                'last_finished_at': job.last_finished_at,
+                'last_duration_ms': job.last_duration_ms,
+                'last_status': job.last_status or None,
+                'last_error': job.last_error or None,
+                'last_result': job.last_result,
+                'last_node': job.last_node or None,
+                'run_count': job.run_count,
+                'failure_count': job.failure_count,
+                'consecutive_failures': job.consecutive_failures,
+            }
+            for job in ScheduledJob.objects.order_by('name')
+        ],
+    }
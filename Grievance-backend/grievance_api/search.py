@@ -0,0 +1,277 @@
+"""
+Full-text search over grievance titles, locations and descriptions.
+
+The database keeps the index itself, so every write path (``save()``,
+``QuerySet.update()``, ``bulk_create``, raw SQL) updates it in the same
+transaction as the row:
+
+* SQLite: ``grievance_search``, an external-content FTS5 table fed by
+  triggers on the grievance table. The triggers only re-index a row when one of
+  the searched columns changes.
+* PostgreSQL: a stored generated ``search_vector`` column (title weighted over
+  location, over description) with a GIN index.
+
+Other databases fall back to substring matching.
+
+``matching(queryset, text)`` narrows any queryset, for instance the role-scoped
+one from ``GrievanceViewSet.get_queryset``, to grievances containing every word
+of ``text``, the last one as a prefix. ``ranked(queryset, text)`` returns the
+best matches first, with a highlighted title and description snippet. At most
+``MAX_CANDIDATES`` matches (the newest) are ranked, so a very common word stays
+cheap, and only the returned page is highlighted.
+"""
+import html
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+DEFAULTS = {
+    'MAX_CANDIDATES': 5000,
+    'MAX_TERMS': 8,
+    'SNIPPET_WORDS': 24,
+}
+
+FTS_TABLE = 'grievance_search'
+TEXT_SEARCH_CONFIG = 'english'
+
+# highlight markers: control characters can't be confused with escaped user text
+_START, _STOP = '\x02', '\x03'
+_WORD_RE = re.compile(r'\w+')
+
+Hit = namedtuple('Hit', 'pk rank title snippet')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SEARCH', {})}
+
+
+def terms(text):
+    return _WORD_RE.findall(text.lower())[:get_config()['MAX_TERMS']]
+
+
+def fts5_query(words):
+    # every term quoted, so user input can never be FTS5 syntax
+    return ' '.join([f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*'])
+
+
+def tsquery(words):
+    return ' & '.join(words[:-1] + [f'{words[-1]}:*'])
+
+
+def highlight(text):
+    """Escape indexed text for HTML and turn the match markers into ``<mark>``."""
+    return html.escape(text or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+# --- index maintenance ------------------------------------------------------
+
+_SQLITE_COLUMNS = 'title, description, location'
+_SQLITE_TRIGGERS = {
+    'grievance_search_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS grievance_search_insert AFTER INSERT ON grievance_api_grievance BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {_SQLITE_COLUMNS}) VALUES (new.id, new.title, new.description, new.location);
+        END""",
+    'grievance_search_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS grievance_search_delete AFTER DELETE ON grievance_api_grievance BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_SQLITE_COLUMNS})
+            VALUES ('delete', old.id, old.title, old.description, old.location);
+        END""",
+    'grievance_search_update': f"""
+        CREATE TRIGGER IF NOT EXISTS grievance_search_update AFTER UPDATE ON grievance_api_grievance
+        WHEN old.title IS NOT new.title OR old.description IS NOT new.description
+             OR old.location IS NOT new.location BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_SQLITE_COLUMNS})
+            VALUES ('delete', old.id, old.title, old.description, old.location);
+            INSERT INTO {FTS_TABLE}(rowid, {_SQLITE_COLUMNS}) VALUES (new.id, new.title, new.description, new.location);
+        END""",
+}
+
+_POSTGRES_INSTALL = [
+    f"""
+    ALTER TABLE grievance_api_grievance ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(location, '')), 'B') ||
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(description, '')), 'C')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS grievance_search_vector_idx ON grievance_api_grievance USING gin (search_vector)",
+]
+
+
+def install(connection):
+    """Create the index for ``connection``; safe to repeat, and re-adds triggers a table rebuild dropped."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                    {_SQLITE_COLUMNS}, content='grievance_api_grievance', content_rowid='id',
+                    tokenize='porter unicode61 remove_diacritics 2'
+                )""")
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'grievance_api_grievance'"
+            )
+            missing = set(_SQLITE_TRIGGERS) - {name for name, in cursor.fetchall()}
+            for name in sorted(missing):
+                cursor.execute(_SQLITE_TRIGGERS[name])
+            if missing:
+                # rows written while triggers were missing are caught up
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            for statement in _POSTGRES_INSTALL:
+                cursor.execute(statement)
+
+
+def repair(connection):
+    """Re-add SQLite triggers lost when a later migration rebuilt the grievance table (see signals.py)."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        installed = cursor.fetchone()
+    if installed:
+        install(connection)
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in _SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS grievance_search_vector_idx')
+            cursor.execute('ALTER TABLE grievance_api_grievance DROP COLUMN IF EXISTS search_vector')
+
+
+# --- queries ----------------------------------------------------------------
+
+def matching(queryset, text):
+    """``queryset`` narrowed to grievances matching ``text``, through the index."""
+    words = terms(text)
+    if not words:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [fts5_query(words)],
+        ))
+    if vendor == 'postgresql':
+        return queryset.alias(search_match=RawSQL(
+            'grievance_api_grievance.search_vector @@ to_tsquery(%s, %s)', [TEXT_SEARCH_CONFIG, tsquery(words)], output_field=BooleanField(),
+        )).filter(search_match=True)
+    for word in words:
+        queryset = queryset.filter(_substring(word))
+    return queryset
+
+
+def _substring(word):
+    return Q(title__icontains=word) | Q(description__icontains=word) | Q(location__icontains=word)
+
+
+def _scope(queryset):
+    """``(sql, params)`` restricting ids to ``queryset``, or None when it is the whole table."""
+    if not queryset.query.where:
+        return None
+    return queryset.order_by().values('pk').query.get_compiler(queryset.db).as_sql()
+
+
+def ranked(queryset, text, limit=20, offset=0):
+    """The best matches in ``queryset`` as ``Hit``s, best first."""
+    words = terms(text)
+    if not words or queryset.query.is_empty():
+        return []
+    connection = connections[queryset.db]
+    scope = _scope(queryset)
+    if connection.vendor == 'sqlite':
+        return _sqlite_ranked(connection, words, scope, limit, offset)
+    if connection.vendor != 'postgresql':
+        return _substring_ranked(queryset, words, limit, offset)
+    sql, params = _postgres_ranked(words, scope, limit, offset)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [Hit(pk, rank, highlight(title), highlight(snippet)) for pk, rank, title, snippet in cursor.fetchall()]
+
+
+def _sqlite_ranked(connection, words, scope, limit, offset):
+    # Three short queries rather than one nested statement: FTS5 runs a match
+    # once per value of a rowid IN (...) it is handed, and sorts every row in
+    # range when asked to ORDER BY rank. A unary + keeps SQLite from passing the
+    # id filters down, and bm25() is only evaluated for candidates.
+    config = get_config()
+    query = fts5_query(words)
+    scope_sql, scope_params = (f'AND +rowid IN ({scope[0]})', list(scope[1])) if scope else ('', [])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {scope_sql} ORDER BY rowid DESC LIMIT %s',
+            [query, *scope_params, config['MAX_CANDIDATES']],
+        )
+        candidates = [pk for pk, in cursor.fetchall()]
+        if not candidates:
+            return []
+
+        # bm25 is lower for better matches; title counts most, then location
+        cursor.execute(f"""
+            SELECT rowid, bm25({FTS_TABLE}, 10.0, 1.0, 4.0) AS score FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s AND rowid BETWEEN %s AND %s AND +rowid IN ({_placeholders(candidates)})
+            ORDER BY score, rowid DESC LIMIT %s OFFSET %s""",
+            [query, candidates[-1], candidates[0], *candidates, limit, offset],
+        )
+        scores = dict(cursor.fetchall())
+        if not scores:
+            return []
+
+        page = list(scores)
+        cursor.execute(f"""
+            SELECT rowid, highlight({FTS_TABLE}, 0, %s, %s), snippet({FTS_TABLE}, 1, %s, %s, '…', %s)
+            FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s AND rowid BETWEEN %s AND %s AND +rowid IN ({_placeholders(page)})""",
+            [_START, _STOP, _START, _STOP, config['SNIPPET_WORDS'], query, min(page), max(page), *page],
+        )
+        marked = {pk: (title, snippet) for pk, title, snippet in cursor.fetchall()}
+    return [Hit(pk, -score, highlight(marked[pk][0]), highlight(marked[pk][1])) for pk, score in scores.items()]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _postgres_ranked(words, scope, limit, offset):
+    config = get_config()
+    scope_sql, scope_params = (f'AND g.id IN ({scope[0]})', list(scope[1])) if scope else ('', [])
+    options = f'StartSel={_START}, StopSel={_STOP}, HighlightAll=true'
+    snippet_options = f"StartSel={_START}, StopSel={_STOP}, MaxWords={config['SNIPPET_WORDS']}, MinWords=8"
+    sql = f"""
+        WITH q AS (SELECT to_tsquery(%s, %s) AS query),
+        candidates AS (
+            SELECT g.id, g.search_vector FROM grievance_api_grievance g, q
+            WHERE g.search_vector @@ q.query {scope_sql}
+            ORDER BY g.id DESC LIMIT %s
+        ),
+        page AS (
+            SELECT c.id, ts_rank_cd(c.search_vector, q.query) AS rank FROM candidates c, q
+            ORDER BY rank DESC, c.id DESC LIMIT %s OFFSET %s
+        )
+        SELECT page.id, page.rank,
+               ts_headline(%s, coalesce(g.title, ''), q.query, %s),
+               ts_headline(%s, g.description, q.query, %s)
+        FROM page JOIN grievance_api_grievance g ON g.id = page.id, q
+        ORDER BY page.rank DESC, page.id DESC
+    """
+    params = [
+        TEXT_SEARCH_CONFIG, tsquery(words), *scope_params, config['MAX_CANDIDATES'], limit, offset,
+        TEXT_SEARCH_CONFIG, options, TEXT_SEARCH_CONFIG, snippet_options,
+    ]
+    return sql, params
+
+
+def _substring_ranked(queryset, words, limit, offset):
+    # no index to rank with: newest matches first, unhighlighted
+    for word in words:
+        queryset = queryset.filter(_substring(word))
+    rows = queryset.order_by('-created_at', '-id').values_list('pk', 'title', 'description')[offset:offset + limit]
+    return [Hit(pk, None, html.escape(title or ''), html.escape(description[:200])) for pk, title, description in rows]
+
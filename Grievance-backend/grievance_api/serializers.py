@@ -4,6 +4,7 @@ from .models import (
     SubDepartment
 )
 from django.contrib.auth.models import User, Group
+from .media import signed_url
 
 from django.contrib.auth.models import Group
 
@@ -42,21 +43,37 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         )
         return user
 
+class SignedFileField(serializers.FileField):
+    """Represented by a signed media URL, which ``<img>`` and download links can use without the token."""
+    def to_representation(self, value):
+        return signed_url(value, self.context.get('request'))
+
+
+class SignedImageField(SignedFileField, serializers.ImageField):
+    pass
+
+
 class GrievanceImageSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    medium = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
 
     class Meta:
         model = GrievanceImage
-        fields = ['id', 'image', 'uploaded_at']
+        fields = ['id', 'image', 'medium', 'thumbnail', 'uploaded_at']
+
+    def _url(self, file):
+        return signed_url(file, self.context.get('request'))
 
     def get_image(self, obj):
-        request = self.context.get('request')
+        return self._url(obj.image)
 
-        if not obj.image or not hasattr(obj.image, 'url'):
-            return None
+    # until a photo is processed its renditions fall back to the original
+    def get_medium(self, obj):
+        return self._url(obj.medium or obj.image)
 
-        url = obj.image.url
-        return request.build_absolute_uri(url) if request else url
+    def get_thumbnail(self, obj):
+        return self._url(obj.thumbnail or obj.image)
 
 
 
@@ -99,10 +116,11 @@ class GrievanceSerializer(serializers.ModelSerializer):
 )
     # ✅ user auto-filled by ViewSet - NOT in form
     user_name = serializers.CharField(source='user.username', read_only=True)
-    signed_document = serializers.FileField(required=False, allow_null=True, allow_empty_file=True)
-    resolution_image = serializers.ImageField(required=False, allow_null=True, allow_empty_file=True)
+    signed_document = SignedFileField(required=False, allow_null=True, allow_empty_file=True)
+    resolution_image = SignedImageField(required=False, allow_null=True, allow_empty_file=True)
     resolution_notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     department_name = serializers.CharField(source='department.name', read_only=True)
+    suggested_category_name = serializers.CharField(source='suggested_category.name', read_only=True, default=None)
 
     class Meta:
         model = Grievance
@@ -110,10 +128,12 @@ class GrievanceSerializer(serializers.ModelSerializer):
         'id', 'title', 'description', 'category_id', 'category', 'status',
         'department', 'department_name', 'location', 'due_date',
         'resolution_notes', 'signed_document', 'resolution_image',
-        'images', 'user_name', 'created_at', 'user'
+        'images', 'user_name', 'created_at', 'user',
+        'suggested_category', 'suggested_category_name', 'suggestion_confidence',
         ]
 
-        read_only_fields = ['created_at', 'user', 'images']  # ✅ user read-only
+        read_only_fields = ['created_at', 'user', 'images',
+                            'suggested_category', 'suggestion_confidence']  # ✅ user read-only
         extra_kwargs = {
         'title': {'required': False, 'allow_blank': True},
         'description': {'required': True},
@@ -0,0 +1,58 @@
+from django.contrib.auth.models import Group, User
+from django.db import connections, models
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from rest_framework.authtoken.models import Token
+from django.dispatch import receiver
+
+from .models import Category, Department, Grievance, GrievanceImage, clear_department_sla_days
+from . import authentication, roles, search, suggestions
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_suggestions(sender, **kwargs):
+    # category names/descriptions are the suggestion labels
+    suggestions.bump_label_version()
+
+
+@receiver([post_save, post_delete], sender=Department)
+def invalidate_department_caches(sender, **kwargs):
+    clear_department_sla_days()
+    roles.invalidate()  # the department's admin may have changed
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_roles(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        roles.invalidate()
+
+
+@receiver(post_delete, sender=Token)
+def revoke_deleted_token(sender, instance, **kwargs):
+    # logout
+    authentication.revoke(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def revoke_user_tokens(sender, instance, **kwargs):
+    # password change, deactivation, profile edits: cached principals must be rebuilt
+    authentication.revoke(instance.pk)
+
+
+@receiver(post_delete, sender=Grievance)
+@receiver(post_delete, sender=GrievanceImage)
+def release_files(sender, instance, **kwargs):
+    # drop the row's references in the content-addressed store; the last one removes the file
+    for field in sender._meta.get_fields():
+        if isinstance(field, models.FileField):
+            stored = getattr(instance, field.name)
+            if stored:
+                stored.storage.delete(stored.name)
+
+
+@receiver(post_migrate)
+def repair_search_index(sender, using, **kwargs):
+    # SQLite drops triggers when a migration rebuilds the grievance table
+    if sender.name == 'grievance_api':
+        search.repair(connections[using])
+
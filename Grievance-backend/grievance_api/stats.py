@@ -0,0 +1,76 @@
+"""
+Admin dashboard statistics.
+
+Every count is a conditional aggregate over one pass of the grievance table,
+plus one GROUP BY for the department breakdown. The result is stored as a
+snapshot in a shared cache for ``ADMIN_STATS['TTL']`` seconds, so however many
+admins poll the dashboard, the database sees about one computation per window.
+``as_of`` tells the client how old the numbers are. Writes don't invalidate the
+snapshot: the scheduler's ``refresh_stats`` job replaces it just before expiry.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Grievance
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'shared',  # every worker serves the same snapshot
+    'TTL': 30,  # seconds
+}
+
+SNAPSHOT_KEY = 'admin-stats:snapshot'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ADMIN_STATS', {})}
+
+
+def compute():
+    today = timezone.now().date()
+    warning_from = today - timedelta(days=3)
+
+    counts = Grievance.objects.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status__in=['Pending', 'Pending at Triage'])),
+        in_progress=Count('id', filter=Q(status='In Progress')),
+        resolved=Count('id', filter=Q(status='Resolved')),
+        overdue=Count('id', filter=Q(due_date__lt=today)),
+        healthy=Count('id', filter=Q(due_date__gte=today)),
+        warning=Count('id', filter=Q(due_date__range=[warning_from, today])),
+        critical=Count('id', filter=Q(due_date__lt=warning_from)),
+    )
+    by_dept = (
+        Grievance.objects.values('department__name')
+        .annotate(count=Count('id'))
+        .order_by('-count')[:5]
+    )
+    return {
+        'total': counts['total'],
+        'pending': counts['pending'],
+        'in_progress': counts['in_progress'],
+        'resolved': counts['resolved'],
+        'overdue': counts['overdue'],
+        'sla': {name: counts[name] for name in ('healthy', 'warning', 'critical')},
+        'by_dept': list(by_dept),
+        'as_of': timezone.now().isoformat(),
+    }
+
+
+def refresh():
+    """Recompute and store a fresh snapshot (the scheduler does this ahead of expiry)."""
+    config = get_config()
+    stats = compute()
+    caches[config['CACHE_ALIAS']].set(SNAPSHOT_KEY, stats, timeout=config['TTL'])
+    return stats
+
+
+def snapshot():
+    """The cached stats, recomputed once the previous snapshot is older than the TTL."""
+    stats = caches[get_config()['CACHE_ALIAS']].get(SNAPSHOT_KEY)
+    if stats is None:
+        stats = refresh()
+    return stats
@@ -0,0 +1,244 @@
+"""
+Content-addressed media storage.
+
+``ContentAddressedStorage`` is the default file storage (see ``STORAGES``).
+Every file is hashed with SHA-256 while it is written to a temporary file, then
+kept once at ``blobs/<2 hex>/<digest><ext>``. A citizen re-submitting the same
+photo, or the pipeline producing the same rendition twice, stores nothing new.
+
+``MediaBlob.refcount`` counts the file fields that point at each blob:
+``save()`` adds a reference and ``delete()`` drops one. After the last one,
+the file and its row are removed once the transaction commits, unless the same
+content was stored again in the meantime. Rows release their files when deleted, and a grievance releases a
+file it replaces (see ``signals.py`` and ``Grievance.save``).
+
+``manage.py dedupe_media`` moves files stored before this backend into the
+store, recounts references from the rows and reclaims orphaned files.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+BLOB_DIR = 'blobs'
+TEMP_PREFIX = '.upload-'
+
+
+def blob_name(digest, name):
+    extension = os.path.splitext(name)[1].lower()[:10]
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}{extension}'
+
+
+def is_blob(name):
+    return name.startswith(f'{BLOB_DIR}/')
+
+
+def file_fields():
+    """``(model, field_name)`` for every file field kept in the default storage."""
+    for model in apps.get_app_config('grievance_api').get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and field.storage is default_storage:
+                yield model, field.name
+
+
+def digest_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def add_reference(name, size):
+    from .models import MediaBlob
+
+    if MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, size=size, refcount=1)
+    except IntegrityError:  # stored concurrently by another request
+        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+
+def release_reference(name):
+    """Drop one reference; True if that was the last one and the file may go."""
+    from .models import MediaBlob
+
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+        if blob is None or blob.refcount <= 0:
+            # not counted yet (dedupe_media will decide), or already on its way out
+            return False
+        # at zero the row stays, as the lock a concurrent add_reference() meets (see _delete_unreferenced)
+        MediaBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+        return blob.refcount == 1
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # the final name comes from the content, in _save()
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        # on the same filesystem as the store, so moving the upload in is a rename
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+
+            name = blob_name(digest.hexdigest(), name)
+            add_reference(name, size)
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def delete(self, name):
+        if not name:
+            return super().delete(name)
+        # after commit, so a rolled-back delete never loses a file its row still points at
+        if not is_blob(name):
+            transaction.on_commit(lambda: self._delete_file(name))  # stored before this backend
+        elif release_reference(name):
+            transaction.on_commit(lambda: self._delete_unreferenced(name))
+
+    def _delete_file(self, name):
+        super().delete(name)
+
+    def _delete_unreferenced(self, name):
+        from .models import MediaBlob
+
+        # The row is deleted, and the file unlinked, only while the count is still zero, in
+        # one transaction. An upload of the same content increments the count through that
+        # row, so either it got there first (nothing is deleted) or its UPDATE waits on the
+        # row lock, finds no row once this commits, and stores the file afresh in _save().
+        with transaction.atomic():
+            if MediaBlob.objects.filter(name=name, refcount=0).delete()[0]:
+                self._delete_file(name)
+
+
+def references():
+    """``Counter`` of stored file name -> how many file fields point at it, read from the rows."""
+    counts = Counter()
+    for model, field in file_fields():
+        names = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}).values_list(field, flat=True)
+        counts.update(names.iterator(chunk_size=2000))
+    return counts
+
+
+def _adopt(storage, name, dry_run, seen):
+    """Move a pre-store file into the store; returns ``(blob name, was it a duplicate)``."""
+    path = storage.path(name)
+    blob = blob_name(digest_file(path), name)
+    duplicate = blob in seen or storage.exists(blob)
+    seen.add(blob)
+    if dry_run:
+        return blob, duplicate
+    if duplicate:
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(storage.path(blob)), exist_ok=True)
+        os.replace(path, storage.path(blob))
+    for model, field in file_fields():
+        model.objects.filter(**{field: name}).update(**{field: blob})
+    return blob, duplicate
+
+
+def _sync_counts(storage, refs, cutoff):
+    from .models import MediaBlob
+
+    stored = {blob.name: blob for blob in MediaBlob.objects.all()}
+    new, changed = [], []
+    for name, count in refs.items():
+        if not is_blob(name):
+            continue
+        blob = stored.pop(name, None)
+        if blob is None:
+            if storage.exists(name):
+                new.append(MediaBlob(name=name, size=storage.size(name), refcount=count))
+        elif blob.refcount != count:
+            blob.refcount = count
+            changed.append(blob)
+    MediaBlob.objects.bulk_create(new, batch_size=1000)
+    MediaBlob.objects.bulk_update(changed, ['refcount'], batch_size=1000)
+    # unreferenced blobs; recent ones may belong to an upload whose row isn't committed yet
+    unused = [blob.pk for blob in stored.values() if blob.created_at.timestamp() < cutoff]
+    MediaBlob.objects.filter(pk__in=unused).delete()
+    return len(new) + len(changed) + len(unused)
+
+
+def _stored_files(storage):
+    """Every file under the store and the upload_to directories, as storage names."""
+    roots = {BLOB_DIR}
+    for model, field in file_fields():
+        upload_to = model._meta.get_field(field).upload_to
+        if isinstance(upload_to, str) and upload_to:
+            roots.add(upload_to.split('/')[0])
+    for root in sorted(roots):
+        for directory, _, files in os.walk(storage.path(root)):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                yield os.path.relpath(path, storage.location).replace(os.sep, '/'), path
+
+
+def dedupe(dry_run=False, min_age=3600):
+    """
+    Bring ``MEDIA_ROOT`` in line with the rows: move files stored before this
+    backend into the store (dropping duplicate copies), recount every blob's
+    references, and delete files no row points at. Files younger than
+    ``min_age`` seconds are left alone, since their row may not be committed yet.
+    """
+    storage = default_storage
+    cutoff = time.time() - min_age
+    refs = references()
+    report = dict.fromkeys(['moved', 'duplicates', 'missing', 'recounted', 'orphans', 'reclaimed_bytes'], 0)
+
+    seen = set()
+    for name in [name for name in refs if not is_blob(name)]:
+        if not storage.exists(name):
+            report['missing'] += 1
+            continue
+        blob, duplicate = _adopt(storage, name, dry_run, seen)
+        report['duplicates' if duplicate else 'moved'] += 1
+        if not dry_run:
+            refs[blob] += refs.pop(name)
+
+    if not dry_run:
+        report['recounted'] = _sync_counts(storage, refs, cutoff)
+
+    from .models import MediaBlob
+    recent = set(MediaBlob.objects.filter(created_at__gte=timezone.now() - timedelta(seconds=min_age))
+                 .values_list('name', flat=True))
+    for name, path in list(_stored_files(storage)):
+        if name in refs or name in recent or os.path.getmtime(path) >= cutoff:
+            continue
+        report['orphans'] += 1
+        report['reclaimed_bytes'] += os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+    return report
+
@@ -0,0 +1,147 @@
+"""
+Cached complaint-type suggestions.
+
+``GrievanceForm.js`` asks for suggestions on every keystroke past 8 characters,
+and many complaints are near-identical, so results are cached in two tiers:
+
+* a small in-process LRU with a short TTL, and
+* the ``suggestions`` Django cache (file-based by default), shared by every
+  worker on the host.
+
+Keys combine the engine and model (``SUGGESTION_INFERENCE``), the label-set
+version and a hash of the normalized description. The version is bumped
+whenever a ``Category`` row changes (see ``signals.py``), so a category edit
+makes every older entry unreachable. Each worker re-reads the version at most
+every ``VERSION_TTL`` seconds, so a lookup served by the in-process tier never
+touches the shared cache, and other workers see an edit within that time.
+
+Hit/miss counters are kept per process: the file-based cache has no atomic
+increment, so shared counters would lose updates between workers.
+"""
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import inference
+from .lru import LRUCache
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'suggestions',
+    'LOCAL_MAX_ENTRIES': 1024,
+    'LOCAL_TTL': 300,  # seconds
+    'SHARED_TTL': 3600,  # seconds
+    'VERSION_TTL': 5,  # seconds a worker trusts its copy of the label version
+}
+
+LABEL_VERSION_KEY = 'suggestions:label-version'
+COUNTER_KEYS = ('local_hits', 'shared_hits', 'misses')
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SUGGESTION_CACHE', {})}
+
+
+def shared_cache():
+    return caches[get_config()['CACHE_ALIAS']]
+
+
+def normalize(description):
+    """Lower-case words only, so case, punctuation and spacing don't split the cache."""
+    return ' '.join(_WORD_RE.findall(description.lower()))
+
+
+_config = get_config()
+local_cache = LRUCache(_config['LOCAL_MAX_ENTRIES'], _config['LOCAL_TTL'])
+local_counts = dict.fromkeys(COUNTER_KEYS, 0)
+_local_version = (0.0, None)  # (expires, label version) as last read from the shared cache
+
+
+def _remember_version(version):
+    global _local_version
+    _local_version = (time.monotonic() + get_config()['VERSION_TTL'], version)
+
+
+def label_version():
+    expires, version = _local_version
+    if version is not None and expires > time.monotonic():
+        return version
+    cache = shared_cache()
+    version = cache.get(LABEL_VERSION_KEY)
+    if version is None:
+        # never reuse an old number, even if the key was evicted
+        version = time.time_ns()
+        cache.add(LABEL_VERSION_KEY, version, timeout=None)
+        version = cache.get(LABEL_VERSION_KEY, version)
+    _remember_version(version)
+    return version
+
+
+def bump_label_version():
+    version = time.time_ns()
+    shared_cache().set(LABEL_VERSION_KEY, version, timeout=None)
+    _remember_version(version)
+    local_cache.clear()
+
+
+def engine_id():
+    """The configured engine, plus a short hash of its model when one is set."""
+    config = inference.get_config()
+    if not config['MODEL']:
+        return config['ENGINE']
+    return f"{config['ENGINE']}-{hashlib.sha1(config['MODEL'].encode()).hexdigest()[:8]}"
+
+
+def cache_key(description, version):
+    digest = hashlib.sha1(normalize(description).encode()).hexdigest()
+    return f'suggestions:{engine_id()}:{version}:{digest}'
+
+
+def _count(name):
+    local_counts[name] += 1
+
+
+def suggest(description, session=None, seq=None):
+    """
+    Top complaint-type labels for ``description``, served from cache when possible.
+
+    ``session``/``seq`` are passed through so the inference queue can drop a
+    request once the same form has sent a newer one.
+    """
+    key = cache_key(description, label_version())
+
+    suggestions = local_cache.get(key)
+    if suggestions is not None:
+        _count('local_hits')
+        return suggestions
+
+    cache = shared_cache()
+    suggestions = cache.get(key)
+    if suggestions is not None:
+        _count('shared_hits')
+    else:
+        _count('misses')
+        suggestions = inference.suggest(description, key=key, session=session, seq=seq)
+        cache.set(key, suggestions, timeout=get_config()['SHARED_TTL'])
+
+    local_cache.set(key, suggestions)
+    return suggestions
+
+
+def stats():
+    """Hit/miss counters for the worker answering the request."""
+    lookups = sum(local_counts.values())
+    return {
+        'label_version': label_version(),
+        'engine': engine_id(),
+        'this_worker': {
+            **local_counts,
+            'hit_rate': round((lookups - local_counts['misses']) / lookups, 3) if lookups else None,
+            'local_entries': len(local_cache),
+            'local_max_entries': local_cache.max_entries,
+        },
+    }
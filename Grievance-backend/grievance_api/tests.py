@@ -1,3 +1,1469 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import closing
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from datetime import timedelta
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from backend.database import database_config
+
+from . import authentication, escalation, images, inference, scheduler, search, stats, suggestions, uploads
+from .filters import GrievanceFilterBackend
+from .pagination import KeysetPagination
+
+try:
+    import numpy as np
+
+    from . import classifiers
+except ImportError:  # ML profile (requirements-ml.txt) not installed
+    classifiers = None
+from .models import (
+    Category, Department, Grievance, GrievanceEvent, GrievanceImage, MediaBlob, ScheduledJob, SchedulerLease,
+    department_sla_days,
+)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_concurrent_requests_share_a_batch(self):
+        batches = []
+
+        def run_batch(descriptions):
+            batches.append(list(descriptions))
+            return [[d.upper()] for d in descriptions]
+
+        batcher = inference.MicroBatcher(run_batch, max_batch_size=4, max_wait=0.5)
+        futures = [batcher.submit(f"text {i}") for i in range(3)]
+        self.assertEqual(batcher.run_once(), 3)
+
+        self.assertEqual(batches, [["text 0", "text 1", "text 2"]])
+        self.assertEqual([f.result() for f in futures], [["TEXT 0"], ["TEXT 1"], ["TEXT 2"]])
+
+    def test_batch_size_is_capped(self):
+        batcher = inference.MicroBatcher(lambda ds: [[d] for d in ds], max_batch_size=2, max_wait=0.5)
+        for i in range(5):
+            batcher.submit(str(i))
+        self.assertEqual(batcher.run_once(), 2)
+
+    def test_identical_requests_are_coalesced(self):
+        batcher = inference.MicroBatcher(lambda ds: [[d] for d in ds], max_wait=0)
+        first = batcher.submit("no water", key="k")
+        second = batcher.submit("no water", key="k")
+        self.assertIs(first, second)
+        self.assertEqual(batcher.run_once(), 1)
+        self.assertEqual(second.result(), ["no water"])
+
+    def test_newer_seq_supersedes_queued_request(self):
+        batches = []
+        batcher = inference.MicroBatcher(lambda ds: batches.append(ds) or [[d] for d in ds], max_wait=0)
+        stale = batcher.submit("garbage not", session="s", seq=1)
+        fresh = batcher.submit("garbage not collected", session="s", seq=2)
+        late = batcher.submit("garbage", session="s", seq=0)
+
+        batcher.run_once()
+        batcher.run_once()
+
+        self.assertEqual(batches, [["garbage not collected"]])
+        self.assertEqual(fresh.result(), ["garbage not collected"])
+        for future in (stale, late):
+            with self.assertRaises(inference.Superseded):
+                future.result()
+
+    def test_saturated_queue_asks_clients_to_retry(self):
+        batcher = inference.MicroBatcher(lambda ds: [[d] for d in ds], max_queue=2, retry_after=3)
+        batcher.submit("one")
+        batcher.submit("two")
+        batcher.submit("two")  # joining a queued request is still allowed
+        with self.assertRaises(inference.InferenceBusy) as ctx:
+            batcher.submit("three")
+        self.assertEqual(ctx.exception.retry_after, 3)
+
+    def test_slow_local_inference_answers_busy(self):
+        stalled = inference.MicroBatcher(lambda ds: [[d] for d in ds])  # never started
+        with override_settings(SUGGESTION_INFERENCE={'TIMEOUT': 0.05, 'RETRY_AFTER': 2}), \
+                mock.patch.object(inference, '_local_batcher', stalled), \
+                mock.patch.object(inference, '_local_engine', object()):
+            with self.assertRaises(inference.InferenceBusy) as ctx:
+                inference.suggest("streetlight broken")
+        self.assertEqual(ctx.exception.retry_after, 2)
+
+
+class SuggestionServerTests(SimpleTestCase):
+    def test_round_trip_and_unavailable(self):
+        socket_path = os.path.join(tempfile.mkdtemp(), "suggest.sock")
+        with self.assertRaises(inference.InferenceUnavailable):
+            inference.request_suggestions("no server yet", socket_path, timeout=0.5)
+
+        batcher = inference.MicroBatcher(lambda ds: [["Pothole Repair"] for _ in ds], max_wait=0).start()
+        server = inference.SuggestionServer(socket_path, batcher)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            self.assertEqual(
+                inference.request_suggestions("road is broken", socket_path, timeout=2),
+                ["Pothole Repair"],
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+@unittest.skipIf(classifiers is None, "numpy not installed")
+class EmbeddingEngineTests(TestCase):
+    def bag_of_words_engine(self):
+        """EmbeddingEngine with a word-count encoder instead of a transformer."""
+        vocabulary = ["garbage", "pothole", "road", "water", "light"]
+        engine = classifiers.EmbeddingEngine.__new__(classifiers.EmbeddingEngine)
+        engine._prepared = None
+        engine.embed = lambda texts: classifiers._normalise([
+            [text.lower().count(word) + 1e-3 for word in vocabulary] for text in texts
+        ])
+        return engine
+
+    def test_ranks_categories_by_cosine_similarity(self):
+        Category.objects.create(name="Pothole Repair", description="Broken road surface")
+        Category.objects.create(name="Uncollected garbage", description="Garbage left on the street")
+        Category.objects.create(name="Streetlight Malfunction", description="Light not working")
+
+        engine = self.bag_of_words_engine()
+        labels = classifiers.candidate_labels()
+        suggestions = engine.classify(["Deep pothole on the road", "garbage everywhere"], labels)
+
+        self.assertEqual(suggestions[0][0], "Pothole Repair")
+        self.assertEqual(suggestions[1][0], "Uncollected garbage")
+        self.assertEqual(len(suggestions[0]), classifiers.TOP_K)
+
+
+class StubNLITokenizer:
+    """Word-level stand-in for the BART tokenizer: ids from a growing vocabulary, <s>=0, </s>=2, pad=1."""
+    pad_token_id = 1
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.calls = 0
+
+    def __call__(self, texts, add_special_tokens=False, truncation=False, max_length=None):
+        self.calls += 1
+        ids = [[self.vocabulary.setdefault(word, len(self.vocabulary) + 10) for word in re.findall(r'\w+', text.lower())]
+               for text in texts]
+        return {'input_ids': [row[:max_length] if truncation else row for row in ids]}
+
+    def build_inputs_with_special_tokens(self, premise, hypothesis):
+        return [0, *premise, 2, 2, *hypothesis, 2]
+
+
+def overlap_logits(input_ids, attention_mask):
+    """Fake NLI head: the entailment logit (index 2) is how many words premise and hypothesis share."""
+    logits = []
+    for ids, mask in zip(input_ids, attention_mask):
+        ids = list(ids[mask.astype(bool)])
+        separator = ids.index(2)
+        premise, hypothesis = set(ids[1:separator]), set(ids[separator + 2:-1])
+        logits.append([0.0, 0.0, float(len(premise & hypothesis))])
+    return np.array(logits)
+
+
+@unittest.skipIf(classifiers is None, "numpy not installed")
+class PrecomputedHypothesisEngineTests(SimpleTestCase):
+    LABELS = ("Pothole Repair", "Road Cave-in", "Uncollected garbage")
+    DESCRIPTIONS = ["pothole repair needed on the road", "garbage uncollected"]
+
+    def stub_engine(self):
+        engine = classifiers.PrecomputedHypothesisEngine.__new__(classifiers.PrecomputedHypothesisEngine)
+        engine.tokenizer = StubNLITokenizer()
+        engine.entailment_id = 2
+        engine.max_length = 64
+        engine._prepared = None
+        engine.logits = mock.Mock(side_effect=overlap_logits)
+        return engine
+
+    def test_softmax_of_entailment_logits_per_description(self):
+        engine = self.stub_engine()
+        labels, scores = engine.scores(self.DESCRIPTIONS, self.LABELS)
+
+        # one row per (description, label), description-major
+        input_ids, _ = engine.logits.call_args.args
+        self.assertEqual(input_ids.shape[0], len(self.DESCRIPTIONS) * len(self.LABELS))
+        self.assertEqual(labels, self.LABELS)
+        np.testing.assert_allclose(scores[0], np.exp([2, 1, 0]) / np.exp([2, 1, 0]).sum(), rtol=1e-6)
+        np.testing.assert_allclose(scores[1], np.exp([0, 0, 2]) / np.exp([0, 0, 2]).sum(), rtol=1e-6)
+
+    def test_rank_orders_top_k(self):
+        engine = self.stub_engine()
+        ranked = engine.rank(self.DESCRIPTIONS, self.LABELS, k=2)
+        self.assertEqual([label for label, _ in ranked[0]], ["Pothole Repair", "Road Cave-in"])
+        self.assertEqual(ranked[1][0][0], "Uncollected garbage")
+        self.assertGreater(ranked[0][0][1], ranked[0][1][1])
+
+    def test_hypotheses_are_tokenized_once_per_label_set(self):
+        engine = self.stub_engine()
+        engine.classify(self.DESCRIPTIONS, self.LABELS)
+        engine.classify(["another pothole"], self.LABELS)
+        self.assertEqual(engine.tokenizer.calls, 3)  # hypotheses once, then premises per call
+
+    def test_matches_the_pipeline_ranking(self):
+        def zero_shot(descriptions, candidate_labels, hypothesis_template, batch_size):
+            """What the transformers pipeline returns, with the same fake NLI head."""
+            results = []
+            for description in descriptions:
+                words = set(re.findall(r'\w+', description.lower()))
+                logits = np.array([
+                    len(words & set(re.findall(r'\w+', hypothesis_template.format(label).lower())))
+                    for label in candidate_labels
+                ], dtype=float)
+                probabilities = np.exp(logits) / np.exp(logits).sum()
+                order = np.argsort(-probabilities, kind='stable')
+                results.append({
+                    'labels': [candidate_labels[i] for i in order],
+                    'scores': [float(probabilities[i]) for i in order],
+                })
+            return results
+
+        pipeline = classifiers.PipelineEngine.__new__(classifiers.PipelineEngine)
+        pipeline.pipe = zero_shot
+        self.assertEqual(
+            self.stub_engine().rank(self.DESCRIPTIONS, self.LABELS),
+            [[(label, mock.ANY) for label, _ in ranked] for ranked in pipeline.rank(self.DESCRIPTIONS, self.LABELS)],
+        )
+        np.testing.assert_allclose(
+            self.stub_engine().scores(self.DESCRIPTIONS, self.LABELS)[1],
+            pipeline.scores(self.DESCRIPTIONS, self.LABELS)[1],
+            rtol=1e-6,
+        )
+
+
+@unittest.skipIf(classifiers is None, "numpy not installed")
+class QuantizedEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.artifact_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.artifact_dir, ignore_errors=True)
+
+    def test_missing_artifact_is_unavailable(self):
+        with self.assertRaises(inference.InferenceUnavailable):
+            classifiers.QuantizedEngine(self.artifact_dir)
+
+    def test_loads_settings_from_metadata(self):
+        metadata = {'format': 'onnx', 'file': 'model.int8.onnx', 'entailment_id': 0, 'max_length': 512}
+        with open(os.path.join(self.artifact_dir, classifiers.ARTIFACT_METADATA), 'w') as f:
+            json.dump(metadata, f)
+        transformers, onnxruntime = mock.Mock(), mock.Mock()
+        onnxruntime.InferenceSession.return_value.run.return_value = [np.zeros((1, 3))]
+
+        with mock.patch.dict(sys.modules, {'transformers': transformers, 'onnxruntime': onnxruntime}):
+            engine = classifiers.QuantizedEngine(self.artifact_dir)
+
+        self.assertEqual((engine.entailment_id, engine.max_length), (0, 512))
+        transformers.AutoTokenizer.from_pretrained.assert_called_once_with(self.artifact_dir)
+        self.assertEqual(
+            onnxruntime.InferenceSession.call_args.args[0], os.path.join(self.artifact_dir, 'model.int8.onnx'),
+        )
+        ids = np.ones((1, 4), dtype=np.int64)
+        self.assertEqual(engine.logits(ids, ids).shape, (1, 3))
+
+
+class StubEngine:
+    """Benchmark stand-in that knows the built-in samples' categories."""
+    name = 'stub'
+    answers = {}
+
+    def __init__(self, model_name=None):
+        pass
+
+    def classify(self, descriptions, labels):
+        return [[self.answers.get(description, "Other")] for description in descriptions]
+
+
+@unittest.skipIf(classifiers is None, "numpy not installed")
+class BenchmarkSuggestionsCommandTests(TestCase):
+    def test_reports_latency_accuracy_and_agreement(self):
+        from .management.commands.benchmark_suggestions import SAMPLE_GRIEVANCES
+
+        class Perfect(StubEngine):
+            name = 'perfect'
+            answers = dict(SAMPLE_GRIEVANCES)
+
+        class Guess(StubEngine):
+            name = 'guess'
+
+        out = StringIO()
+        with mock.patch.dict(classifiers.ENGINES, {'perfect': Perfect, 'guess': Guess}):
+            call_command('benchmark_suggestions', engines=['perfect', 'guess'], repeat=1, stdout=out)
+
+        perfect, guess = out.getvalue().splitlines()[1:]
+        self.assertIn('top-1 100%', perfect)
+        self.assertIn('p95', perfect)
+        self.assertIn('top-1 0%', guess)
+        self.assertIn('agrees with perfect 0%', guess)
+
+
+# every alias in settings.CACHES, in memory, so tests never see files left by earlier runs
+LOCMEM_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'{alias}-tests'}
+    for alias in ('default', 'suggestions', 'shared')
+}
+
+
+class FreshCachesMixin:
+    """In-memory caches, emptied before every test, so cached roles or tables never leak between tests."""
+
+    def setUp(self):
+        super().setUp()
+        for cache in caches.all():
+            cache.clear()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SuggestionCacheTests(TestCase):
+    def setUp(self):
+        suggestions.shared_cache().clear()
+        suggestions.local_cache.clear()
+        self.enterContext(mock.patch.object(suggestions, '_local_version', (0.0, None)))
+        self.enterContext(mock.patch.dict(suggestions.local_counts, dict.fromkeys(suggestions.COUNTER_KEYS, 0)))
+
+    @mock.patch.object(inference, 'suggest', return_value=["Uncollected garbage"])
+    def test_normalized_repeats_hit_the_cache(self, suggest):
+        self.assertEqual(suggestions.suggest("Garbage not collected"), ["Uncollected garbage"])
+        self.assertEqual(suggestions.suggest("  garbage NOT collected!! "), ["Uncollected garbage"])
+
+        suggestions.local_cache.clear()  # as seen from another worker
+        suggestions.suggest("garbage not collected")
+
+        self.assertEqual(suggest.call_count, 1)
+        counts = suggestions.stats()['this_worker']
+        self.assertEqual((counts['local_hits'], counts['shared_hits'], counts['misses']), (1, 1, 1))
+
+    @mock.patch.object(inference, 'suggest', return_value=["Uncollected garbage"])
+    def test_local_hits_do_not_touch_the_shared_cache(self, suggest):
+        suggestions.suggest("garbage not collected")
+        with mock.patch.object(suggestions, 'shared_cache') as shared_cache:
+            suggestions.suggest("garbage not collected")
+        shared_cache.assert_not_called()
+
+    @mock.patch.object(inference, 'suggest', side_effect=[["Pothole Repair"], ["Road Cave-in"]])
+    def test_engine_change_does_not_reuse_labels(self, suggest):
+        with override_settings(SUGGESTION_INFERENCE={'ENGINE': 'precomputed'}):
+            suggestions.suggest("pothole near the bus stop")
+        with override_settings(SUGGESTION_INFERENCE={'ENGINE': 'quantized'}):
+            self.assertEqual(suggestions.suggest("pothole near the bus stop"), ["Road Cave-in"])
+
+    @mock.patch.object(inference, 'suggest', return_value=["Pothole Repair"])
+    def test_category_edit_invalidates(self, suggest):
+        suggestions.suggest("pothole near the bus stop")
+        Category.objects.create(name="Road Cave-in")
+        suggestions.suggest("pothole near the bus stop")
+        self.assertEqual(suggest.call_count, 2)
+
+    @unittest.skipIf(classifiers is None, "numpy not installed")
+    def test_batches_query_labels_once_per_label_version(self):
+        engine = mock.Mock()
+        engine.classify.side_effect = lambda descriptions, labels: [list(labels)] * len(descriptions)
+        Category.objects.create(name="Pothole Repair")
+
+        with self.assertNumQueries(1):
+            inference.classify_batch(engine, ["pothole"])
+            inference.classify_batch(engine, ["another pothole"])
+
+        Category.objects.create(name="Road Cave-in")
+        self.assertIn("Road Cave-in", inference.classify_batch(engine, ["road caved in"])[0])
+
+
+class ReadinessTests(SimpleTestCase):
+    def test_preloading_worker_is_not_ready_until_the_model_loads(self):
+        with override_settings(SUGGESTION_INFERENCE={'PRELOAD': 'boot'}), \
+                mock.patch.object(inference, '_local_engine', None):
+            self.assertEqual(self.client.get('/api/health/ready/').status_code, 503)
+        with override_settings(SUGGESTION_INFERENCE={'PRELOAD': 'boot'}), \
+                mock.patch.object(inference, '_local_engine', object()):
+            self.assertEqual(self.client.get('/api/health/ready/').status_code, 200)
+
+    def test_lazy_worker_is_ready_immediately(self):
+        with override_settings(SUGGESTION_INFERENCE={'PRELOAD': 'lazy'}):
+            response = self.client.get('/api/health/ready/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['model_loaded'])
+
+
+IMPORT_PROBE = """
+import os, sys, django
+os.environ['DJANGO_SETTINGS_MODULE'] = 'backend.settings'
+django.setup()
+import backend.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(','.join(m for m in ('torch', 'transformers', 'numpy', 'onnxruntime') if m in sys.modules))
+"""
+
+
+class ImportTimeTests(SimpleTestCase):
+    """Web workers, migrations and auto_escalate must not pay for the ML stack."""
+    BUDGET_SECONDS = 1.0
+
+    def test_urlconf_import_stays_light(self):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', IMPORT_PROBE],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), '', 'heavy ML modules imported by the URLconf')
+
+        # "import time: self [us] | cumulative | package"; top-level imports have one leading space
+        top_level = []
+        for line in result.stderr.splitlines():
+            parts = line.split('|')
+            if len(parts) == 3 and parts[1].strip().isdigit() and not parts[2].startswith('  '):
+                top_level.append((int(parts[1]) / 1e6, parts[2].strip()))
+        total = sum(seconds for seconds, _ in top_level)
+        slowest = ', '.join(f'{name} {seconds:.2f}s' for seconds, name in sorted(top_level, reverse=True)[:5])
+        self.assertLess(total, self.BUDGET_SECONDS, f'imports took {total:.2f}s; slowest: {slowest}')
+
+
+class FakeRankingEngine:
+    """Ranks 'Pothole Repair' first for anything mentioning a road."""
+    def __init__(self):
+        self.calls = []
+
+    def rank(self, descriptions, labels, k=3):
+        self.calls.append(list(descriptions))
+        return [[("Pothole Repair" if "road" in d else "Uncollected garbage", 0.9)] for d in descriptions]
+
+
+@unittest.skipIf(classifiers is None, "numpy not installed")
+class AutoClassifyCommandTests(TestCase):
+    def setUp(self):
+        self.other = Category.objects.create(name="Other")
+        self.pothole = Category.objects.create(name="Pothole Repair")
+        Category.objects.create(name="Uncollected garbage")
+        user = User.objects.create_user("citizen")
+        self.grievances = [
+            Grievance.objects.create(user=user, category=self.other, description=f"broken road {i}")
+            for i in range(5)
+        ]
+        self.categorised = Grievance.objects.create(user=user, category=self.pothole, description="road")
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), "auto_classify.checkpoint")
+
+    def run_command(self, engine, **options):
+        with mock.patch.object(inference, 'get_local_engine', return_value=engine):
+            call_command('auto_classify', checkpoint=self.checkpoint, stdout=open(os.devnull, 'w'), **options)
+
+    def test_stores_suggestions_in_batches(self):
+        engine = FakeRankingEngine()
+        self.run_command(engine, chunk_size=3, batch_size=2)
+
+        self.assertEqual([len(call) for call in engine.calls], [2, 1, 2])
+        for grievance in self.grievances:
+            grievance.refresh_from_db()
+            self.assertEqual(grievance.suggested_category, self.pothole)
+            self.assertEqual(grievance.suggestion_confidence, 0.9)
+        self.categorised.refresh_from_db()
+        self.assertIsNone(self.categorised.suggested_at)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumes_from_checkpoint(self):
+        with open(self.checkpoint, 'w') as f:
+            f.write(str(self.grievances[2].pk))
+        engine = FakeRankingEngine()
+        self.run_command(engine, refresh=True)
+        self.assertEqual(engine.calls, [["broken road 3", "broken road 4"]])
+
+    def test_follow_picks_up_older_grievances_recategorised_later(self):
+        older = self.grievances[0]
+        Grievance.objects.filter(pk=older.pk).update(category=self.pothole)
+
+        class StopFollowing(Exception):
+            pass
+
+        def sleep(seconds):
+            if Grievance.objects.filter(pk=older.pk, category=self.other).exists():
+                raise StopFollowing()
+            Grievance.objects.filter(pk=older.pk).update(category=self.other)
+
+        with mock.patch('grievance_api.management.commands.auto_classify.time') as fake_time:
+            fake_time.sleep.side_effect = sleep
+            with self.assertRaises(StopFollowing):
+                self.run_command(FakeRankingEngine(), follow=True)
+
+        older.refresh_from_db()
+        self.assertEqual(older.suggested_category, self.pothole)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GrievanceListTests(FreshCachesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authority = User.objects.create_user("authority")
+        self.authority.groups.add(Group.objects.create(name="TOP_AUTHORITY"))
+        self.client.force_authenticate(self.authority)
+
+        citizen = User.objects.create_user("citizen")
+        self.health = Department.objects.create(name="Health")
+        self.roads = Department.objects.create(name="Roads")
+        today = timezone.now().date()
+        self.grievances = []
+        for i in range(7):
+            self.grievances.append(Grievance.objects.create(
+                user=citizen, title=f"Grievance {i}", description="drain blocked" if i % 2 else "pothole",
+                department=self.health if i < 4 else self.roads, status="In Progress",
+                due_date=today - timedelta(days=1) if i in (1, 5) else today + timedelta(days=5),
+            ))
+
+    def test_keyset_pages_cover_everything_once(self):
+        seen = []
+        url = '/api/grievances/?page_size=3'
+        while url:
+            page = self.client.get(url).json()
+            seen += [g['id'] for g in page['results']]
+            url = page['next']
+        self.assertEqual(seen, [g.id for g in reversed(self.grievances)])
+
+    def test_unpaginated_list_is_unchanged(self):
+        self.assertEqual(len(self.client.get('/api/grievances/').json()), 7)
+
+    def test_filters(self):
+        def ids(query):
+            return {g['id'] for g in self.client.get(f'/api/grievances/?page_size=50&{query}').json()['results']}
+
+        g = self.grievances
+        self.assertEqual(ids('department=Health'), {x.id for x in g[:4]})
+        self.assertEqual(ids(f'department={self.roads.id}&search=drain'), {g[5].id})
+        self.assertEqual(ids('overdue=true'), {g[1].id, g[5].id})
+        self.assertEqual(ids(f'due_before={timezone.now().date()}'), {g[1].id, g[5].id})
+        self.assertEqual(self.client.get('/api/grievances/?due_after=soon').status_code, 400)
+        self.assertEqual(self.client.get('/api/grievances/?due_after=2024-02-30').status_code, 400)
+
+    def test_count_is_not_capped_by_the_page_size(self):
+        self.assertEqual(self.client.get('/api/grievances/count/?overdue=true').json(), {'count': 2})
+        with mock.patch('grievance_api.pagination.KeysetPagination.max_page_size', 1):
+            self.assertEqual(self.client.get('/api/grievances/count/?department=Health').json(), {'count': 4})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GrievanceQueryCountTests(FreshCachesMixin, APITestCase):
+    """
+    Serializing grievances must cost the same number of queries for 1 row or 20.
+    Counts are for a returning user, whose roles come from the cache.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.citizen = User.objects.create_user("citizen")
+        self.authority = User.objects.create_user("authority")
+        self.authority.groups.add(Group.objects.create(name="TOP_AUTHORITY"))
+        self.dept_admin = User.objects.create_user("dept-admin")
+        self.dept_admin.groups.add(Group.objects.create(name="DEPARTMENT_ADMIN"))
+        self.triage = User.objects.create_user("triage")
+        self.triage.groups.add(Group.objects.create(name="TRIAGE_USER"))
+
+        self.department = Department.objects.create(name="Health", admin=self.dept_admin)
+        self.category = Category.objects.create(name="Mosquitoes problems", department=self.department)
+        self.other = Category.objects.create(name="Other", department=self.department)
+
+    def add_grievances(self, count):
+        for i in range(count):
+            grievance = Grievance.objects.create(
+                user=self.citizen, description=f"issue {i}", status="In Review",
+                category=self.category if i % 2 else self.other, department=self.department,
+            )
+            GrievanceImage.objects.create(grievance=grievance, image=f"grievance_images/{i}.jpg")
+
+    def login(self, user):
+        # a fresh user object per request, as token authentication would give
+        self.client.force_authenticate(User.objects.get(pk=user.pk))
+
+    def assertConstantQueries(self, user, url, expected):
+        self.add_grievances(1)
+        self.login(user)
+        self.client.get(url)
+        for more in (0, 20):
+            self.add_grievances(more)
+            self.login(user)
+            with self.assertNumQueries(expected):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_roles_are_loaded_once(self):
+        self.add_grievances(1)
+        self.login(self.dept_admin)
+        with self.assertNumQueries(4):  # groups + administered departments, then the list
+            self.client.get('/api/grievances/')
+        self.login(self.dept_admin)
+        with self.assertNumQueries(2):
+            self.client.get('/api/grievances/')
+
+    def test_group_change_invalidates_cached_roles(self):
+        self.login(self.citizen)
+        self.assertEqual(self.client.get('/api/triage-grievances/').status_code, 403)
+        self.citizen.groups.add(Group.objects.get(name="TRIAGE_USER"))
+        self.login(self.citizen)
+        self.assertEqual(self.client.get('/api/triage-grievances/').status_code, 200)
+
+    def test_citizen_list(self):
+        self.assertConstantQueries(self.citizen, '/api/grievances/', 2)
+
+    def test_citizen_paginated_list(self):
+        self.assertConstantQueries(self.citizen, '/api/grievances/?page_size=50', 2)
+
+    def test_top_authority_list(self):
+        self.assertConstantQueries(self.authority, '/api/grievances/', 2)
+
+    def test_department_admin_list(self):
+        self.assertConstantQueries(self.dept_admin, '/api/grievances/', 2)
+
+    def test_triage_list(self):
+        self.assertConstantQueries(self.triage, '/api/triage-grievances/', 2)
+
+    def test_admin_grievance_list(self):
+        self.assertConstantQueries(self.authority, '/api/admin-grievances/', 2)
+
+    def test_detail(self):
+        self.add_grievances(1)
+        url = f'/api/grievances/{Grievance.objects.get().pk}/'
+        self.login(self.citizen)
+        self.client.get(url)
+        self.login(self.citizen)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ADMIN_STATS={'CACHE_ALIAS': 'shared', 'TTL': 60})
+@override_settings(CACHES=LOCMEM_CACHES)
+class AdminStatsTests(FreshCachesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user("admin", is_staff=True)
+        department = Department.objects.create(name="Roads")
+        today = timezone.now().date()
+        for status, due in [
+            ("Pending", today + timedelta(days=5)),
+            ("In Progress", today - timedelta(days=1)),
+            ("In Progress", today - timedelta(days=10)),
+            ("Resolved", today + timedelta(days=1)),
+        ]:
+            Grievance.objects.create(
+                user=self.admin, description=status, status=status, department=department, due_date=due,
+            )
+
+    def test_counts_in_one_pass(self):
+        with self.assertNumQueries(2):  # conditional aggregates + department breakdown
+            result = stats.compute()
+        self.assertEqual(
+            {k: result[k] for k in ('total', 'pending', 'in_progress', 'resolved', 'overdue')},
+            {'total': 4, 'pending': 1, 'in_progress': 2, 'resolved': 1, 'overdue': 2},
+        )
+        self.assertEqual(result['sla'], {'healthy': 2, 'warning': 1, 'critical': 1})
+        self.assertEqual(result['by_dept'], [{'department__name': 'Roads', 'count': 4}])
+
+    def test_snapshot_is_served_from_cache(self):
+        self.client.force_authenticate(self.admin)
+        first = self.client.get('/api/admin-stats/').json()
+        Grievance.objects.create(user=self.admin, description="new", status="Pending")
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/admin-stats/').json()
+        self.assertEqual(second, first)
+        self.assertIn('as_of', second)
+
+        stats.refresh()  # the scheduler's refresh_stats job
+        self.assertEqual(self.client.get('/api/admin-stats/').json()['total'], 5)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GrievanceSaveTests(TestCase):
+    def setUp(self):
+        self.citizen = User.objects.create_user("citizen")
+        self.department = Department.objects.create(name="Water", sla_days=10)
+        self.today = timezone.now().date()
+        department_sla_days()  # warm the SLA table, as any earlier request would have
+
+    def test_create_costs_one_insert(self):
+        with self.assertNumQueries(1):
+            grievance = Grievance.objects.create(
+                user=self.citizen, description="leak", status="In Review", department=self.department,
+            )
+        self.assertEqual(grievance.due_date, self.today + timedelta(days=10))
+
+    def test_status_change_costs_one_update(self):
+        grievance = Grievance.objects.create(user=self.citizen, description="leak", status="In Review")
+        grievance = Grievance.objects.get(pk=grievance.pk)
+        Grievance.objects.filter(pk=grievance.pk).update(due_date=self.today)
+
+        grievance.status = "Pending Approval"
+        with self.assertNumQueries(1):
+            grievance.save()
+        # the SLA restarts for the new stage
+        self.assertEqual(grievance.due_date, self.today + timedelta(days=3))
+
+        # saving again without a status change keeps the due date
+        grievance.due_date = self.today
+        with self.assertNumQueries(1):
+            grievance.save()
+        self.assertEqual(grievance.due_date, self.today)
+
+    def test_department_sla_edit_is_picked_up(self):
+        self.department.sla_days = 2
+        self.department.save()
+        grievance = Grievance.objects.create(
+            user=self.citizen, description="leak", status="In Review", department=self.department,
+        )
+        self.assertEqual(grievance.due_date, self.today + timedelta(days=2))
+
+    def test_deferred_status_is_still_compared_to_the_stored_value(self):
+        grievance = Grievance.objects.create(user=self.citizen, description="leak", status="In Review")
+        grievance = Grievance.objects.defer('status').get(pk=grievance.pk)
+        Grievance.objects.filter(pk=grievance.pk).update(status="In Progress", due_date=self.today)
+        grievance.status = "Policy Decision"
+        grievance.save()
+        self.assertEqual(grievance.due_date, self.today + timedelta(days=5))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AuditTrailTests(FreshCachesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.authority = User.objects.create_user("authority")
+        self.authority.groups.add(Group.objects.create(name="TOP_AUTHORITY"))
+        self.client.force_authenticate(self.authority)
+        self.grievance = Grievance.objects.create(user=self.authority, description="leak", status="In Review")
+
+    def event_inserts(self, queries):
+        return [q for q in queries if q['sql'].startswith('INSERT INTO "grievance_api_grievanceevent"')]
+
+    def test_update_writes_every_change_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/grievances/{self.grievance.pk}/',
+                {'status': 'Pending Approval', 'resolution_notes': 'Crew assigned'},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.event_inserts(queries)), 1)
+        self.assertEqual(
+            sorted(GrievanceEvent.objects.values_list('action', flat=True)),
+            ['DUE_DATE_UPDATED', 'RESOLUTION_NOTES_UPDATED', 'STATUS_CHANGED'],
+        )
+        self.assertEqual(GrievanceEvent.objects.get(action='STATUS_CHANGED').notes, 'In Review -> Pending Approval')
+
+    def test_unchanged_update_writes_nothing(self):
+        self.client.patch(f'/api/grievances/{self.grievance.pk}/', {'status': 'In Review'})
+        self.assertFalse(GrievanceEvent.objects.exists())
+
+    def test_grant_extension(self):
+        Grievance.objects.filter(pk=self.grievance.pk).update(status='Pending Approval')
+        old_due = self.grievance.due_date
+        self.authority.is_staff = True
+        self.authority.save()
+        response = self.client.post(f'/api/admin-grievances/{self.grievance.pk}/grant_extension/')
+        self.assertEqual(response.status_code, 200)
+        event = GrievanceEvent.objects.get()
+        self.assertEqual((event.action, event.user), ('SLA_EXTENSION_GRANTED', self.authority))
+        self.assertEqual(event.extra_data, {'from': str(old_due), 'to': str(old_due + timedelta(days=14))})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CachedTokenAuthenticationTests(FreshCachesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        authentication.local_cache.clear()
+        self.user = User.objects.create_user("citizen", password="old-password")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def me(self):
+        return self.client.get('/api/me/')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.assertEqual(self.me().status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.me().json()['username'], "citizen")
+        self.assertFalse([q for q in queries if 'authtoken_token' in q['sql']])
+
+    def test_logout_revokes_the_token(self):
+        self.me()
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 204)
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_deactivation_revokes_cached_tokens(self):
+        self.me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_revocation_during_the_lookup_is_not_cached_away(self):
+        load = authentication.TokenAuthentication.authenticate_credentials
+
+        def load_then_revoke(auth, key):
+            loaded = load(auth, key)
+            authentication.revoke(self.user.pk)  # e.g. a logout landing mid-request
+            return loaded
+
+        with mock.patch.object(authentication.TokenAuthentication, 'authenticate_credentials', load_then_revoke):
+            self.me()
+        with CaptureQueriesContext(connection) as queries:
+            self.me()
+        self.assertTrue([q for q in queries if 'authtoken_token' in q['sql']])
+
+    def test_password_change_is_seen(self):
+        self.me()
+        self.user.set_password("new-password")
+        self.user.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.me().status_code, 200)
+        self.assertTrue([q for q in queries if 'authtoken_token' in q['sql']])
+
+
+def phone_photo(name='photo.jpg', size=(3000, 2000)):
+    """A JPEG the way phones send them: large, rotated by EXIF and geotagged."""
+    exif = Image.Exif()
+    exif[0x0112] = 6  # orientation: rotate 90 degrees clockwise to display
+    exif[0x8825] = {2: (12.0, 58.0, 0.0)}  # GPS latitude
+    out = BytesIO()
+    Image.new('RGB', size, 'orange').save(out, 'JPEG', exif=exif)
+    return SimpleUploadedFile(name, out.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImagePipelineTests(FreshCachesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.citizen = User.objects.create_user("citizen")
+        self.client.force_authenticate(self.citizen)
+        self.grievance = Grievance.objects.create(user=self.citizen, description="broken pipe")
+
+    def open_image(self, field_file):
+        with field_file.open('rb'):
+            image = Image.open(BytesIO(field_file.read()))
+            image.load()
+        return image
+
+    def test_upload_is_reencoded_with_renditions(self):
+        response = self.client.post(
+            f'/api/grievances/{self.grievance.pk}/upload_image/', {'image': phone_photo()}, format='multipart',
+        )
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertIn('.webp?expires=', body['thumbnail'])
+        self.assertEqual(len({body['image'], body['medium'], body['thumbnail']}), 3)
+
+        stored = GrievanceImage.objects.get()
+        original = self.open_image(stored.image)
+        self.assertEqual((original.format, original.size), ('WEBP', (1365, 2048)))  # upright and bounded
+        self.assertFalse(original.getexif())
+        self.assertEqual(self.open_image(stored.medium).size, (682, 1024))
+        self.assertEqual(self.open_image(stored.thumbnail).size, (256, 256))
+
+    def test_resolution_image_is_stripped(self):
+        self.grievance.resolution_image = phone_photo('fixed.jpg', size=(800, 600))
+        self.grievance.save()
+        image = self.open_image(self.grievance.resolution_image)
+        self.assertEqual((image.format, image.size), ('WEBP', (600, 800)))
+        self.assertFalse(image.getexif())
+
+    def test_non_images_are_stored_as_sent(self):
+        with self.assertLogs('grievance_api.images', 'WARNING'):
+            gallery_image = GrievanceImage.objects.create(
+                grievance=self.grievance, image=SimpleUploadedFile('notes.jpg', b'not an image'),
+            )
+        self.assertIsNotNone(gallery_image.processed_at)
+        self.assertFalse(gallery_image.thumbnail)
+        with gallery_image.image.open('rb'):
+            self.assertEqual(gallery_image.image.read(), b'not an image')
+
+    def test_deferred_processing(self):
+        with override_settings(IMAGE_PIPELINE={'PROCESS_ON_UPLOAD': False, 'FORMAT': 'JPEG'}):
+            gallery_image = GrievanceImage.objects.create(grievance=self.grievance, image=phone_photo())
+            upload = gallery_image.image.name
+            self.assertIsNone(gallery_image.processed_at)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(images.process_pending(), 1)
+            self.assertEqual(images.process_pending(), 0)
+
+        gallery_image.refresh_from_db()
+        self.assertTrue(gallery_image.thumbnail.name.endswith('.jpg'))
+        self.assertEqual(self.open_image(gallery_image.image).format, 'JPEG')
+        self.assertFalse(gallery_image.image.storage.exists(upload))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UploadTests(FreshCachesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.enterContext(mock.patch('sys.stdout', StringIO()))  # perform_create reports routing with print()
+        self.client.force_authenticate(User.objects.create_user("citizen"))
+        self.category = Category.objects.create(name="Pothole Repair")
+
+    def create(self, *photos):
+        return self.client.post(
+            '/api/grievances/',
+            {'description': 'pothole', 'category_id': self.category.pk, 'images': list(photos)},
+            format='multipart',
+        )
+
+    def test_images_are_inserted_together(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.create(phone_photo('a.jpg', (400, 300)), phone_photo('b.jpg', (400, 300)))
+        self.assertEqual(response.status_code, 201)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "grievance_api_grievanceimage"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(GrievanceImage.objects.filter(thumbnail__endswith='.webp').count(), 2)
+
+    def test_oversized_file_is_refused_before_the_view(self):
+        with override_settings(UPLOADS={'MAX_FILE_SIZE': 1024}):
+            response = self.create(SimpleUploadedFile('big.jpg', b'x' * 4096))
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('big.jpg', response.json()['detail'])
+        self.assertFalse(Grievance.objects.exists())
+
+    def test_limits_on_count_and_total_size(self):
+        with override_settings(UPLOADS={'MAX_FILES': 2}):
+            self.assertEqual(self.create(*[SimpleUploadedFile(f'{i}.jpg', b'x') for i in range(3)]).status_code, 413)
+        with override_settings(UPLOADS={'MAX_TOTAL_SIZE': 3000}), self.assertLogs('grievance_api.images', 'WARNING'):
+            response = self.create(*[SimpleUploadedFile(f'{i}.jpg', b'x' * 1000) for i in range(2)])
+        self.assertEqual(response.status_code, 201)  # 2000 bytes of files, the form fields don't count
+        with override_settings(UPLOADS={'MAX_TOTAL_SIZE': 3000}):
+            response = self.create(*[SimpleUploadedFile(f'{i}.jpg', b'x' * 1000) for i in range(4)])
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(Grievance.objects.count(), 1)
+
+    def test_large_files_spill_to_disk(self):
+        handler = uploads.SpooledUploadHandler()
+        handler.config['SPOOL_MEMORY_SIZE'] = 100
+        for size, on_disk in ((50, False), (500, True)):
+            handler.new_file('images', 'photo.jpg', 'image/jpeg', None)
+            handler.receive_data_chunk(b'x' * size, 0)
+            upload = handler.file_complete(size)
+            self.assertEqual((upload.size, upload.file._rolled), (size, on_disk))
+            upload.close()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, IMAGE_PIPELINE={'PROCESS_ON_UPLOAD': False})
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.grievance = Grievance.objects.create(user=User.objects.create_user("citizen"), description="leak")
+
+    def attach(self, content, name='photo.jpg'):
+        return GrievanceImage.objects.create(grievance=self.grievance, image=SimpleUploadedFile(name, content))
+
+    def test_identical_uploads_share_one_blob(self):
+        first, second = self.attach(b'same bytes', 'a.jpg'), self.attach(b'same bytes', 'b.jpg')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(second.image.storage.exists(second.image.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(second.image.storage.exists(second.image.name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_same_content_stored_before_the_deferred_delete_survives(self):
+        first = self.attach(b'same bytes')
+        name = first.image.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get().refcount, 0)  # kept until the file is gone
+
+        second = self.attach(b'same bytes')  # revives the zero-count row before the unlink runs
+        for callback in callbacks:
+            callback()
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(second.image.storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get().refcount, 1)
+
+    def test_replaced_file_is_released(self):
+        self.grievance.signed_document = SimpleUploadedFile('v1.pdf', b'first draft')
+        self.grievance.save()
+        old = self.grievance.signed_document.name
+        grievance = Grievance.objects.get(pk=self.grievance.pk)
+        grievance.signed_document = SimpleUploadedFile('v2.pdf', b'signed copy')
+        with self.captureOnCommitCallbacks(execute=True):
+            grievance.save()
+        self.assertFalse(grievance.signed_document.storage.exists(old))
+        self.assertEqual(list(MediaBlob.objects.values_list('name', flat=True)), [grievance.signed_document.name])
+
+    def test_rolled_back_delete_keeps_a_pre_store_file(self):
+        os.makedirs(os.path.join(self.media_root, 'signed_documents'))
+        with open(os.path.join(self.media_root, 'signed_documents', 'old.pdf'), 'wb') as f:
+            f.write(b'signed before the store')
+        Grievance.objects.filter(pk=self.grievance.pk).update(signed_document='signed_documents/old.pdf')
+        grievance = Grievance.objects.get(pk=self.grievance.pk)
+        storage = grievance.signed_document.storage
+
+        with self.captureOnCommitCallbacks(execute=False):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                grievance.delete()
+                raise RuntimeError("rolled back")
+        self.assertTrue(storage.exists('signed_documents/old.pdf'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Grievance.objects.get(pk=self.grievance.pk).delete()
+        self.assertFalse(storage.exists('signed_documents/old.pdf'))
+
+    def test_dedupe_media_command(self):
+        folder = os.path.join(self.media_root, 'grievance_images')
+        os.makedirs(folder)
+        for name, content in (('a.jpg', b'same'), ('b.jpg', b'same'), ('gone.jpg', b'deleted grievance')):
+            with open(os.path.join(folder, name), 'wb') as f:
+                f.write(content)
+        # rows written before content-addressed storage, straight to their upload_to paths
+        for name in ('a.jpg', 'b.jpg'):
+            GrievanceImage.objects.bulk_create([GrievanceImage(grievance=self.grievance, image=f'grievance_images/{name}')])
+
+        call_command('dedupe_media', min_age=0, stdout=StringIO())
+
+        [name] = set(GrievanceImage.objects.values_list('image', flat=True))
+        self.assertTrue(name.startswith('blobs/'))
+        self.assertEqual(MediaBlob.objects.get().refcount, 2)
+        self.assertEqual(os.listdir(folder), [])  # both copies moved or dropped, the orphan reclaimed
+
+
+@override_settings(CACHES=LOCMEM_CACHES, IMAGE_PIPELINE={'PROCESS_ON_UPLOAD': False})
+class MediaServingTests(FreshCachesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.owner = User.objects.create_user("owner")
+        grievance = Grievance.objects.create(user=self.owner, description="leak")
+        self.photo = GrievanceImage.objects.create(
+            grievance=grievance, image=SimpleUploadedFile('photo.jpg', b'0123456789'),
+        )
+        self.url = f'/media/{self.photo.image.name}'
+
+    def signed(self):
+        self.client.force_authenticate(self.owner)
+        url = self.client.get('/api/grievances/').json()[0]['images'][0]['image']
+        self.client.force_authenticate(None)
+        return url
+
+    def test_signed_url_is_served_with_cache_validators(self):
+        response = self.client.get(self.signed())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['ETag'], f'"{os.path.splitext(os.path.basename(self.photo.image.name))[0]}"')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(self.signed(), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.signed(), HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 2-5/10', '4'))
+        self.assertEqual(self.client.get(self.signed(), HTTP_RANGE='bytes=-3').getvalue(), b'789')
+        self.assertEqual(self.client.get(self.signed(), HTTP_RANGE='bytes=20-').status_code, 416)
+        # a stale If-Range gets the whole file
+        response = self.client.get(self.signed(), HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_access_without_a_signature_mirrors_owner_or_admin(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(f'{self.url}?expires=9999999999&sig=forged').status_code, 401)
+        self.client.force_authenticate(User.objects.create_user("neighbour"))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.client.force_authenticate(User.objects.create_user("staff", is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_offload_to_nginx(self):
+        with override_settings(MEDIA_SERVING={'OFFLOAD': 'x-accel-redirect'}):
+            response = self.client.get(self.signed())
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.photo.image.name}')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SearchTests(FreshCachesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.citizen = User.objects.create_user("citizen")
+        self.other = User.objects.create_user("other")
+        self.by_title = Grievance.objects.create(
+            user=self.citizen, title="Water leak <b>urgent</b>", description="Pipe burst near the school",
+        )
+        self.by_description = Grievance.objects.create(
+            user=self.citizen, title="Road", description="Water pooling after the pothole was patched",
+        )
+        self.elsewhere = Grievance.objects.create(user=self.other, title="Water meter", description="Broken meter")
+        self.client.force_authenticate(self.citizen)
+
+    def find(self, query):
+        return self.client.get(f'/api/grievances/search/?{query}').json()
+
+    def test_ranked_and_highlighted_within_the_users_grievances(self):
+        body = self.find('q=water')
+        self.assertEqual([g['id'] for g in body['results']], [self.by_title.id, self.by_description.id])
+        top = body['results'][0]['search']
+        self.assertEqual(top['title'], '<mark>Water</mark> leak &lt;b&gt;urgent&lt;/b&gt;')
+        self.assertIn('<mark>Water</mark> pooling', body['results'][1]['search']['snippet'])
+        self.assertIsNone(body['next_offset'])
+
+        self.assertEqual(self.find('q=water&limit=1')['next_offset'], 1)
+        self.assertEqual([g['id'] for g in self.find('q=wat&status=Pending&offset=1')['results']], [self.by_description.id])
+        self.assertEqual(self.find('q="*OR meter')['results'], [])  # query syntax is never interpreted
+
+    def test_index_follows_writes(self):
+        Grievance.objects.filter(pk=self.by_title.pk).update(title="Sewage overflow")
+        self.by_description.delete()
+        self.assertEqual(self.find('q=water')['results'], [])
+        self.assertEqual([g['id'] for g in self.find('q=sewage')['results']], [self.by_title.id])
+
+    def test_search_filter_uses_the_index(self):
+        ids = lambda q: {g['id'] for g in self.client.get(f'/api/grievances/?page_size=50&search={q}').json()['results']}
+        self.assertEqual(ids('pothol'), {self.by_description.id})
+        self.assertEqual(ids('pipe school'), {self.by_title.id})
+        self.assertEqual(ids('pipe meter'), set())
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite triggers')
+    def test_repair_restores_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER grievance_search_insert')
+        Grievance.objects.create(user=self.citizen, title="Streetlight", description="Dark corner")
+        search.repair(connection)
+        self.assertEqual(len(self.find('q=streetlight')['results']), 1)
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def test_postgres_url(self):
+        with mock.patch.dict(os.environ, {'DB_CONN_MAX_AGE': '120', 'DB_STATEMENT_TIMEOUT_MS': '5000', 'DB_POOL_MAX_SIZE': '0'}):
+            config = database_config('postgres://app:p%40ss@db:6543/grievance?sslmode=require', 'unused')
+        self.assertEqual(
+            {k: config[k] for k in ('ENGINE', 'NAME', 'USER', 'PASSWORD', 'HOST', 'PORT', 'CONN_MAX_AGE')},
+            {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'grievance', 'USER': 'app',
+             'PASSWORD': 'p@ss', 'HOST': 'db', 'PORT': '6543', 'CONN_MAX_AGE': 120},
+        )
+        self.assertEqual(config['OPTIONS'], {'options': '-c statement_timeout=5000', 'sslmode': 'require'})
+
+    def test_pool_replaces_persistent_connections(self):
+        with mock.patch.dict(os.environ, {'DB_POOL_MAX_SIZE': '8'}):
+            config = database_config('postgresql://app@db/grievance', 'unused')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 8)
+
+    def test_sqlite_is_the_default(self):
+        config = database_config('', '/srv/db.sqlite3')
+        self.assertEqual((config['ENGINE'], config['NAME']), ('django.db.backends.sqlite3', '/srv/db.sqlite3'))
+
+
+SEED_LEGACY = """
+from django.contrib.auth.models import User
+from grievance_api.models import Department, Grievance, GrievanceEvent
+user = User.objects.create_user("citizen")
+department = Department.objects.create(name="Water", sla_days=4)
+for i in range(5):
+    grievance = Grievance.objects.create(user=user, description=f"leak {i}", department=department, status="In Review")
+    GrievanceEvent.objects.create(grievance=grievance, action="CREATED")
+"""
+
+
+class MigrateFromSqliteTests(SimpleTestCase):
+    """Runs in subprocesses: each side is a separate DATABASE_URL, as in a real move to PostgreSQL."""
+
+    def manage(self, database, *args, **kwargs):
+        env = {**os.environ, 'DATABASE_URL': f'sqlite:///{database}'}
+        return subprocess.run(
+            [sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True, **kwargs,
+        )
+
+    def test_copies_every_row_in_batches(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source, target = os.path.join(directory, 'legacy.sqlite3'), os.path.join(directory, 'new.sqlite3')
+
+        self.manage(source, 'migrate', '-v0')
+        self.manage(source, 'shell', '-c', SEED_LEGACY)
+        self.manage(target, 'migrate', '-v0')
+        self.manage(target, 'shell', '-c', 'from django.contrib.auth.models import User; User.objects.create(username="stale")')
+
+        self.manage(target, 'migrate_from_sqlite', '--source', source, '--batch-size', '2', '--no-input')
+
+        query = "SELECT {} FROM grievance_api_grievance g JOIN auth_user u ON u.id = g.user_id ORDER BY g.id"
+        with closing(sqlite3.connect(source)) as old, closing(sqlite3.connect(target)) as new:
+            columns = "g.id, g.description, g.created_at, g.due_date, u.username"
+            # values are copied verbatim, not re-derived by save() or auto_now_add
+            self.assertEqual(new.execute(query.format(columns)).fetchall(), old.execute(query.format(columns)).fetchall())
+            self.assertEqual(new.execute("SELECT username FROM auth_user").fetchall(), [("citizen",)])
+            self.assertEqual(new.execute("SELECT COUNT(*) FROM grievance_api_grievanceevent").fetchone(), (5,))
+
+
+class AutoEscalateCommandTests(TestCase):
+    def setUp(self):
+        self.citizen = User.objects.create_user("citizen")
+        self.department = Department.objects.create(name="Water", sla_days=10)
+        self.today = timezone.now().date()
+        past = self.today - timedelta(days=2)
+        self.triage_late = self.create("In Review", past)
+        self.triage_on_time = self.create("In Review", self.today)
+        self.dept_late = self.create("In Progress", past, department=self.department)
+        self.resolved_late = self.create("Resolved", past)
+
+    def create(self, status, due_date, department=None):
+        grievance = Grievance.objects.create(
+            user=self.citizen, description=status, status=status, department=department,
+        )
+        Grievance.objects.filter(pk=grievance.pk).update(due_date=due_date)
+        return grievance
+
+    def run_command(self, *args):
+        call_command('auto_escalate', *args, stdout=StringIO())
+
+    def test_escalates_overdue_grievances_in_batches(self):
+        for i in range(4):
+            self.create("In Review", self.today - timedelta(days=1))
+        before = dict(Grievance.objects.values_list('pk', 'updated_at'))
+        self.run_command('--batch-size', '2')
+
+        statuses = dict(Grievance.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[self.triage_late.pk], "Pending Approval")
+        self.assertEqual(statuses[self.triage_on_time.pk], "In Review")
+        self.assertEqual(statuses[self.dept_late.pk], "Policy Decision")
+        self.assertEqual(statuses[self.resolved_late.pk], "Resolved")
+        self.assertEqual(Grievance.objects.filter(status="Pending Approval").count(), 5)
+
+        # the SLA restarts as Grievance.save() would: department SLA, else the stage default
+        self.triage_late.refresh_from_db()
+        self.dept_late.refresh_from_db()
+        self.assertEqual(self.triage_late.due_date, self.today + timedelta(days=3))
+        self.assertEqual(self.dept_late.due_date, self.today + timedelta(days=10))
+        self.assertGreater(self.triage_late.updated_at, before[self.triage_late.pk])
+        self.assertGreater(self.dept_late.updated_at, before[self.dept_late.pk])
+        self.triage_on_time.refresh_from_db()
+        self.assertEqual(self.triage_on_time.updated_at, before[self.triage_on_time.pk])
+
+        event = GrievanceEvent.objects.get(grievance=self.dept_late)
+        self.assertEqual(event.action, 'SLA_ESCALATED')
+        self.assertEqual(event.notes, 'In Progress -> Policy Decision')
+        self.assertEqual(GrievanceEvent.objects.count(), 6)
+
+    def test_queries_do_not_grow_with_rows(self):
+        def count_queries(overdue_rows):
+            for i in range(overdue_rows):
+                self.create("In Review", self.today - timedelta(days=1))
+            with CaptureQueriesContext(connection) as queries:
+                escalation.escalate(batch_size=1000, today=self.today)
+            Grievance.objects.filter(status="Pending Approval").update(status="In Review", due_date=self.today)
+            Grievance.objects.filter(pk=self.dept_late.pk).update(status="In Progress", due_date=self.today - timedelta(days=1))
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(50))
+
+    def test_dry_run_writes_nothing(self):
+        self.run_command('--dry-run')
+        self.assertEqual(Grievance.objects.filter(status="In Review").count(), 2)
+        self.assertFalse(GrievanceEvent.objects.exists())
+
+
+class SchedulerTests(APITestCase):
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def make_scheduler(self, node, jobs):
+        config = {**scheduler.get_config(), 'JITTER': 0, 'JOBS': {name: 60 for name in jobs}}
+        return scheduler.Scheduler(jobs=jobs, config=config, node=node)
+
+    def test_only_the_lease_holder_runs_jobs(self):
+        calls = []
+        jobs = {'ping': lambda: calls.append(1) or {'pong': True}}
+        leader, follower = self.make_scheduler('a', jobs), self.make_scheduler('b', jobs)
+
+        self.assertEqual([job.name for job in leader.tick()], ['ping'])
+        self.assertEqual(follower.tick(), [])
+        self.assertEqual(leader.tick(), [])  # not due again for a minute
+        self.assertEqual(len(calls), 1)
+
+        # the leader dies: its lease lapses and the follower takes over
+        SchedulerLease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        ScheduledJob.objects.update(next_run_at=None)
+        self.assertEqual([job.last_node for job in follower.tick()], ['b'])
+        self.assertFalse(leader.acquire_lease())
+
+    def test_failing_job_backs_off(self):
+        def broken():
+            raise RuntimeError("database on fire")
+        runner = self.make_scheduler('a', {'broken': broken})
+
+        for failures in (1, 2):
+            ScheduledJob.objects.update(next_run_at=None)
+            with self.assertLogs('grievance_api.scheduler', 'ERROR'):
+                [job] = runner.tick()
+            self.assertEqual(job.last_status, 'failed')
+            self.assertEqual(job.consecutive_failures, failures)
+            delay = (job.next_run_at - job.last_finished_at).total_seconds()
+            self.assertAlmostEqual(delay, 60 * 2 ** failures, delta=1)
+        self.assertIn("database on fire", job.last_error)
+
+    def test_status_endpoint(self):
+        self.make_scheduler('a', {'ping': lambda: {'pong': True}}).tick()
+        self.client.force_authenticate(User.objects.create_user("admin", is_staff=True))
+        body = self.client.get('/api/scheduler/status/').json()
+        self.assertEqual(body['leader'], 'a')
+        [job] = body['jobs']
+        self.assertEqual((job['name'], job['last_status'], job['last_result']), ('ping', 'ok', {'pong': True}))
+        self.assertIsNotNone(job['last_duration_ms'])
+
+
+class SchedulerLeaseHeartbeatTests(TransactionTestCase):
+    """The heartbeat thread needs its own committed view of the lease row, hence no wrapping transaction."""
+
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def make_scheduler(self, node, jobs):
+        config = {**scheduler.get_config(), 'JITTER': 0, 'LEASE_SECONDS': 0.5, 'JOBS': {name: 60 for name in jobs}}
+        return scheduler.Scheduler(jobs=jobs, config=config, node=node)
+
+    def test_lease_outlives_a_long_job(self):
+        follower = self.make_scheduler('b', {})
+        attempts = []
+
+        def slow():
+            for _ in range(3):
+                time.sleep(0.5)  # three lease lengths in all
+                attempts.append(follower.acquire_lease())
+            return {}
+
+        [job] = self.make_scheduler('a', {'slow': slow}).tick()
+        self.assertEqual(job.last_status, 'ok')
+        self.assertEqual(attempts, [False] * 3)
+
+    def test_lost_lease_stops_further_jobs(self):
+        ran = []
+
+        def stolen():
+            ran.append('stolen')
+            SchedulerLease.objects.update(holder='b', expires_at=timezone.now() + timedelta(minutes=5))
+            time.sleep(0.5)
+            return {}
+
+        jobs = {'a_stolen': stolen, 'b_next': lambda: ran.append('next') or {}}
+        runner = self.make_scheduler('a', jobs)
+        now = timezone.now()
+        ScheduledJob.objects.bulk_create([
+            ScheduledJob(name='a_stolen', next_run_at=now - timedelta(minutes=1)),
+            ScheduledJob(name='b_next', next_run_at=now),
+        ])
+        with self.assertLogs('grievance_api.scheduler', 'ERROR'):
+            runner.tick()
+        self.assertEqual(ran, ['stolen'])
+
+
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN the hot grievance queries and check each is served by the index
+    meant for it (see Grievance.Meta.indexes), so a renamed field or a
+    reworded filter can't silently fall back to a full scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.citizen = User.objects.create_user("citizen")
+        cls.department = Department.objects.create(name="Health")
+        cls.other = Category.objects.create(name="Other", department=cls.department)
+        today = timezone.now().date()
+        Grievance.objects.bulk_create(
+            Grievance(
+                user=cls.citizen, description=f"issue {i}", category=cls.other,
+                department=cls.department, status=status, due_date=today + timedelta(days=i - 10),
+            )
+            for i, status in enumerate(["In Review", "In Progress", "Resolved", "Pending"] * 5)
+        )
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            # on a tiny table the planner prefers a seq scan; ask which index it *would* use
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                return queryset.explain()
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, *index_names):
+        """The plan must go through one of ``index_names`` (planners may pick either of two that fit)."""
+        plan = self.plan(queryset)
+        self.assertTrue(
+            any(name in plan for name in index_names),
+            f"expected one of {index_names} in plan:\n{plan}",
+        )
+
+    def test_citizen_list(self):
+        self.assertUsesIndex(
+            Grievance.objects.filter(user=self.citizen).order_by('-created_at', '-id'),
+            'grievance_user_created_idx',
+        )
+
+    def test_department_admin_list(self):
+        departments = Department.objects.filter(pk=self.department.pk)
+        self.assertUsesIndex(
+            Grievance.objects.filter(department__in=departments).order_by('-created_at', '-id'),
+            'grievance_dept_created_idx',
+        )
+
+    def test_triage_queue(self):
+        self.assertUsesIndex(
+            Grievance.objects.filter(category__name="Other", status="In Review").order_by('-created_at'),
+            'grievance_triage_idx',
+        )
+
+    def test_escalation_scan(self):
+        self.assertUsesIndex(
+            escalation.overdue("In Progress", timezone.now().date()),
+            'grievance_status_due_idx',
+        )
+
+    def test_overdue_filter(self):
+        self.assertUsesIndex(
+            GrievanceFilterBackend().filter_queryset(
+                mock.Mock(query_params={'overdue': 'true'}), Grievance.objects.all(), None,
+            ),
+            'grievance_open_due_idx', 'grievance_status_due_idx',
+        )
+
+    def test_due_date_range(self):
+        today = timezone.now().date()
+        self.assertUsesIndex(
+            Grievance.objects.filter(due_date__gte=today, due_date__lte=today + timedelta(days=3)),
+            'grievance_due_date_idx',
+        )
+
+    def test_keyset_page(self):
+        # a second page, so the query carries the cursor predicate the API issues
+        paginator = KeysetPagination()
+        request = Request(APIRequestFactory().get('/api/grievances/', {'page_size': 5}))
+        paginator.paginate_queryset(Grievance.objects.all(), request)
+        self.assertIsNotNone(paginator.next_cursor)
+        self.assertUsesIndex(
+            paginator.seek(Grievance.objects.all(), paginator.next_cursor)[:paginator.size + 1],
+            'grievance_created_id_idx',
+        )
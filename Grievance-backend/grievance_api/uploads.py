@@ -0,0 +1,115 @@
+"""
+Multipart upload handling.
+
+``SpooledUploadHandler`` replaces Django's memory and temporary-file handlers
+(see ``FILE_UPLOAD_HANDLERS``). Each file is written chunk by chunk to a
+``SpooledTemporaryFile``, which stays in memory up to ``SPOOL_MEMORY_SIZE``
+and then rolls over to a file in ``FILE_UPLOAD_TEMP_DIR``. Limits are
+enforced while the body is read, before anything reaches a view or the ORM:
+
+* a declared ``Content-Length`` that can't fit is refused before reading,
+* a file over ``MAX_FILE_SIZE`` or a body over ``MAX_TOTAL_SIZE`` stops the
+  upload at the chunk that crosses the line,
+* more than ``MAX_FILES`` files is refused at the first extra one.
+
+A refused upload answers 413 with the limit that was hit.
+"""
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousOperation
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import GrievanceImage
+
+DEFAULTS = {
+    'MAX_FILE_SIZE': 15 * 1024 * 1024,  # bytes
+    'MAX_TOTAL_SIZE': 50 * 1024 * 1024,  # all files in one request
+    'MAX_FILES': 10,
+    'SPOOL_MEMORY_SIZE': 1024 * 1024,  # per file, before it spills to disk
+    'CHUNK_SIZE': 64 * 1024,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'UPLOADS', {})}
+
+
+class UploadRejected(APIException, SuspiciousOperation):
+    # a SuspiciousOperation too, so plain Django views (the admin) answer 400 instead of 500
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Upload too large.'
+    default_code = 'upload_too_large'
+
+
+def _megabytes(size):
+    return f'{size / (1024 * 1024):g} MB'
+
+
+class SpooledUploadedFile(UploadedFile):
+    """An upload held in a ``SpooledTemporaryFile``; removed when closed."""
+
+    def __init__(self, name, content_type, charset, content_type_extra, max_memory):
+        file = tempfile.SpooledTemporaryFile(max_size=max_memory, dir=settings.FILE_UPLOAD_TEMP_DIR)
+        super().__init__(file, name, content_type, 0, charset, content_type_extra)
+
+
+class SpooledUploadHandler(FileUploadHandler):
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.config = get_config()
+        self.chunk_size = self.config['CHUNK_SIZE']
+        self.files = 0
+        self.total_size = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # non-file fields are capped separately by DATA_UPLOAD_MAX_MEMORY_SIZE
+        allowance = self.config['MAX_TOTAL_SIZE'] + (settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0)
+        if content_length > allowance:
+            raise UploadRejected(f"Request body is larger than {_megabytes(allowance)}.")
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.files += 1
+        if self.files > self.config['MAX_FILES']:
+            raise UploadRejected(f"At most {self.config['MAX_FILES']} files can be uploaded at once.")
+        self.file = SpooledUploadedFile(
+            self.file_name, self.content_type, self.charset, self.content_type_extra,
+            max_memory=self.config['SPOOL_MEMORY_SIZE'],
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        self.total_size += len(raw_data)
+        if start + len(raw_data) > self.config['MAX_FILE_SIZE']:
+            self.file.close()
+            raise UploadRejected(f"{self.file_name} is larger than {_megabytes(self.config['MAX_FILE_SIZE'])}.")
+        if self.total_size > self.config['MAX_TOTAL_SIZE']:
+            self.file.close()
+            raise UploadRejected(f"Uploads are larger than {_megabytes(self.config['MAX_TOTAL_SIZE'])} in total.")
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+def create_images(grievance, files):
+    """
+    One ``GrievanceImage`` per uploaded file, inserted with a single
+    ``bulk_create``. Photos are processed first, outside the transaction, unless
+    ``IMAGE_PIPELINE['PROCESS_ON_UPLOAD']`` leaves them to the scheduler.
+    """
+    rows = [GrievanceImage(grievance=grievance, image=file) for file in files]
+    for row in rows:
+        row.prepare()
+    with transaction.atomic():
+        return GrievanceImage.objects.bulk_create(rows)
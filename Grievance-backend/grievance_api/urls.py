@@ -12,8 +12,12 @@ from .views import (
     AdminGrievanceViewSet,
     MeView,
     custom_login,
+    logout,
     UserRegistrationView,
     suggest_complaint_type,
+    suggestion_cache_stats,
+    readiness,
+    scheduler_status,
     GrievanceEventListView,
 )
 from rest_framework.authtoken import views as drf_authtoken_views
@@ -29,10 +33,14 @@ router.register(r'admin-grievances', AdminGrievanceViewSet, basename='admin-grie
 router.register(r'admin-stats', AdminStatsViewSet, basename='admin-stats')
 
 urlpatterns = [
+    path('health/ready/', readiness, name='readiness'),
     path('auth/login/', custom_login, name='custom-login'),
+    path('auth/logout/', logout, name='logout'),
     path('auth/register/', UserRegistrationView.as_view(), name='user-register'),
     path('me/', MeView.as_view(), name='me'),
     path('suggest-complaint-type/', suggest_complaint_type, name='suggest-complaint-type'),
+    path('suggest-complaint-type/stats/', suggestion_cache_stats, name='suggest-complaint-type-stats'),
+    path('scheduler/status/', scheduler_status, name='scheduler-status'),
     path('grievances/<int:grievance_id>/events/', GrievanceEventListView.as_view(),
          name='grievance-events'),
     path('', include(router.urls)),
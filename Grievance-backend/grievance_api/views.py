@@ -19,35 +19,66 @@ from .serializers import (
     GrievanceImageSerializer,
 )
 from .models import Grievance, Department, SubDepartment, Category, GrievanceEvent, GrievanceImage
-from transformers import pipeline
+from . import audit, inference, roles, scheduler, search, stats, suggestions, uploads
+from .filters import GrievanceFilterBackend
+from .permissions import visible_grievances
+from .pagination import KeysetPagination
 from rest_framework.views import APIView
-from rest_framework.authentication import TokenAuthentication
+from .authentication import CachedTokenAuthentication
 from django.db.models import Count, F, ExpressionWrapper, IntegerField
 
 from django.db.models.functions import Now
 from django.shortcuts import get_object_or_404
 
 # AI Complaint Type Suggestion
-classifier = None  # ✅ do not load model here
-
 @api_view(['POST'])
 def suggest_complaint_type(request):
-    global classifier
-    if classifier is None:
-        classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
-
     description = request.data.get('description', '')
-    labels = [
-        "Uncollected garbage", "Garbage dumping", "Contaminated water supply",
-        "Mosquitoes problems", "Issues with food quality", "Pothole Repair",
-        "Streetlight Malfunction", "Low Water Pressure", "Blocked Sewers / Drainage",
-        "Stormwater Drain Issues", "Other"
-    ]
     if not description:
         return Response({"suggestions": []})
 
-    result = classifier(description, candidate_labels=labels)
-    return Response({"suggestions": result["labels"][:3]})
+    # optional per-form token: a higher seq from the same session replaces queued older ones
+    session = request.data.get('session') or None
+    try:
+        seq = int(request.data.get('seq'))
+    except (TypeError, ValueError):
+        seq = None
+    if session:
+        session = f"{request.user.pk}:{session}"
+
+    try:
+        labels = suggestions.suggest(description, session=session, seq=seq)
+    except inference.InferenceBusy as exc:
+        response = Response({"suggestions": [], "retry_after": exc.retry_after}, status=status.HTTP_202_ACCEPTED)
+        response['Retry-After'] = str(exc.retry_after)
+        return response
+    except inference.Superseded:
+        return Response({"suggestions": [], "superseded": True})
+    except inference.InferenceUnavailable:
+        # service down or slow: the form falls back to the full category list
+        labels = []
+    return Response({"suggestions": labels})
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def readiness(request):
+    ready, details = inference.readiness()
+    return Response(
+        {"ready": ready, **details},
+        status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def suggestion_cache_stats(request):
+    return Response(suggestions.stats())
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def scheduler_status(request):
+    return Response(scheduler.status())
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -64,6 +95,12 @@ def custom_login(request):
         })
     return Response({'error': 'Invalid credentials'}, status=400)
 
+@api_view(['POST'])
+def logout(request):
+    # deleting the token revokes it on every worker (see signals.py)
+    Token.objects.filter(user=request.user).delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
 class UserRegistrationView(APIView):
     permission_classes = [AllowAny]
     def post(self, request, *args, **kwargs):
@@ -91,58 +128,30 @@ class IsTriageUser(BasePermission):
     def has_permission(self, request, view):
         return (
             request.user.is_authenticated and
-            request.user.groups.filter(name='TRIAGE_USER').exists()
+            roles.for_user(request.user).is_triage
         )
 
 class GrievanceViewSet(viewsets.ModelViewSet):
     serializer_class = GrievanceSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    filter_backends = [GrievanceFilterBackend]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        user = self.request.user
-
-        if user.groups.filter(name='TOP_AUTHORITY').exists():
-            return Grievance.objects.all()
-
-        if user.groups.filter(name='DEPARTMENT_ADMIN').exists():
-            departments = Department.objects.filter(admin=user)
-            if not departments.exists():
-                return Grievance.objects.none()
-            return Grievance.objects.filter(department__in=departments)
-
-        if user.groups.filter(name='TRIAGE_USER').exists():
-            return (
-                Grievance.objects
-                .filter(category__name="Other", status="In Review")
-                .order_by('-created_at')
-            )
-
-
-
-        if user.is_staff:
-            return Grievance.objects.all()
-
-        return Grievance.objects.filter(user=user).order_by('-created_at')
+        return visible_grievances(self.request.user).with_related()
 
     def perform_create(self, serializer):
-        print("🔍 DATA:", dict(self.request.data))
-        print("🔍 FILES:", [f.name for f in self.request.FILES.getlist('images')])
-        print("🔍 FILES count:", len(self.request.FILES.getlist('images')))
         user = self.request.user
         
         # ✅ 1. SAVE grievance FIRST (creates grievance instance)
         grievance = serializer.save(user=user)
         
-        # ✅ 2. CREATE GrievanceImage records from FormData
-        for img_file in self.request.FILES.getlist('images'):
-            GrievanceImage.objects.create(
-                grievance=grievance,
-                image=img_file
-            )
+        # ✅ 2. CREATE GrievanceImage records from FormData (limits enforced by uploads.SpooledUploadHandler)
+        uploads.create_images(grievance, self.request.FILES.getlist('images'))
         
         # ✅ 3. TRIAGE logic (your existing code)
-        if user.groups.filter(name='TRIAGE_USER').exists():
+        if roles.for_user(user).is_triage:
             other_category = get_object_or_404(Category, name="Other")
             grievance.category = other_category
             grievance.status = "In Review"
@@ -184,62 +193,47 @@ class GrievanceViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
 
-    def perform_update(self, serializer):
-        grievance = self.get_object()
+    @action(detail=False, methods=['get'])
+    def count(self, request):
+        """How many grievances the list would return with the same filters, without paging."""
+        return Response({'count': self.filter_queryset(self.get_queryset()).count()})
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search within the grievances this user can see, narrowed
+        by the usual list filters. ``?q=`` words, ``limit`` (max 50) and ``offset``.
+        """
+        text = request.query_params.get('q', '').strip()
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 50))
+            offset = max(0, int(request.query_params.get('offset', 0)))
+        except ValueError:
+            raise serializers.ValidationError({'limit': 'limit and offset must be integers.'})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        hits = search.ranked(queryset, text, limit=limit + 1, offset=offset)
+        has_more = len(hits) > limit
+        hits = hits[:limit]
+        grievances = queryset.in_bulk([hit.pk for hit in hits])
+
+        results = []
+        for hit in hits:
+            if hit.pk not in grievances:  # deleted since the index was read
+                continue
+            data = self.get_serializer(grievances[hit.pk]).data
+            data['search'] = {'rank': hit.rank, 'title': hit.title, 'snippet': hit.snippet}
+            results.append(data)
+        return Response({
+            'query': text,
+            'results': results,
+            'next_offset': offset + limit if has_more else None,
+        })
 
-        old_status = grievance.status
-        old_due_date = grievance.due_date
-        old_resolution_notes = grievance.resolution_notes
-        old_signed_document = grievance.signed_document.name if grievance.signed_document else None
-        old_resolution_image = grievance.resolution_image.name if grievance.resolution_image else None
-
-        updated = serializer.save()  # triggers your model.save() (SLA recalculation)
-
-        # 1) Status change event
-        if old_status != updated.status:
-            GrievanceEvent.objects.create(
-                grievance=updated,
-                user=self.request.user,
-                action='STATUS_CHANGED',
-                notes=f'{old_status} -> {updated.status}'
-            )
-
-        # 2) SLA changed (due_date changed) event
-        if old_due_date != updated.due_date:
-            GrievanceEvent.objects.create(
-                grievance=updated,
-                user=self.request.user,
-                action='DUE_DATE_UPDATED',
-                notes=f'{old_due_date} -> {updated.due_date}'
-            )
-
-        # 3) Resolution notes updated
-        if old_resolution_notes != updated.resolution_notes:
-            GrievanceEvent.objects.create(
-                grievance=updated,
-                user=self.request.user,
-                action='RESOLUTION_NOTES_UPDATED',
-                notes='Updated'
-            )
-
-        # 4) Files uploaded
-        new_signed_document = updated.signed_document.name if updated.signed_document else None
-        if old_signed_document != new_signed_document and new_signed_document:
-            GrievanceEvent.objects.create(
-                grievance=updated,
-                user=self.request.user,
-                action='SIGNED_DOCUMENT_UPLOADED',
-                notes=new_signed_document
-            )
-
-        new_resolution_image = updated.resolution_image.name if updated.resolution_image else None
-        if old_resolution_image != new_resolution_image and new_resolution_image:
-            GrievanceEvent.objects.create(
-                grievance=updated,
-                user=self.request.user,
-                action='RESOLUTION_IMAGE_UPLOADED',
-                notes=new_resolution_image
-            )
+    def perform_update(self, serializer):
+        # serializer.instance is the row DRF already loaded via get_object()
+        with audit.track(serializer.instance, self.request.user):
+            serializer.save()  # triggers your model.save() (SLA recalculation)
 
 
 class TriageGrievanceViewSet(viewsets.ModelViewSet):
@@ -249,7 +243,7 @@ class TriageGrievanceViewSet(viewsets.ModelViewSet):
         return (
             Grievance.objects
                 .filter(category__name="Other", status="In Review")
-                .select_related('category')
+                .with_related()
                 .order_by('-created_at')
         )
 
@@ -266,8 +260,8 @@ class AdminGrievanceViewSet(viewsets.ReadOnlyModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
-        if user.groups.filter(name='TOP_AUTHORITY').exists():
-            return Grievance.objects.all().order_by('-created_at')
+        if roles.for_user(user).is_top_authority:
+            return Grievance.objects.with_related().order_by('-created_at')
         return Grievance.objects.none()
     
   
@@ -278,40 +272,21 @@ class AdminGrievanceViewSet(viewsets.ReadOnlyModelViewSet):
         grievance = self.get_object()
         if grievance.status not in ['Policy Decision', 'Pending Approval']:
             return Response({'error': f'Invalid status: {grievance.status}'}, status=400)
-        if grievance.due_date:
-            grievance.due_date += timedelta(days=14)
-        else:
-            grievance.due_date = timezone.now().date() + timedelta(days=14)
-        grievance.save(update_fields=['due_date'])
-        GrievanceEvent.objects.create(grievance=grievance, user=request.user, action='SLA_EXTENSION_GRANTED', notes=f'14-day extension')
+        with audit.track(grievance, request.user, diff=False) as changes:
+            old_due_date = grievance.due_date
+            if grievance.due_date:
+                grievance.due_date += timedelta(days=14)
+            else:
+                grievance.due_date = timezone.now().date() + timedelta(days=14)
+            grievance.save(update_fields=['due_date'])
+            changes.add('SLA_EXTENSION_GRANTED', '14-day extension', extra_data={
+                'from': str(old_due_date) if old_due_date else None, 'to': str(grievance.due_date),
+            })
         return Response({'message': 'Extension granted', 'new_due_date': grievance.due_date.isoformat()})
 
 class AdminStatsViewSet(viewsets.ViewSet):
     def list(self, request):
-        today = timezone.now().date()
-
-        stats = {
-            'total': Grievance.objects.count(),
-            'pending': Grievance.objects.filter(status__in=['Pending', 'Pending at Triage']).count(),
-            'in_progress': Grievance.objects.filter(status='In Progress').count(),
-            'resolved': Grievance.objects.filter(status='Resolved').count(),
-            'overdue': Grievance.objects.filter(due_date__lt=today).count(),
-        }
-        stats['sla'] = {
-            'healthy': Grievance.objects.filter(due_date__gte=today).count(),
-            'warning': Grievance.objects.filter(
-                due_date__range=[today - timedelta(days=3), today]
-            ).count(),
-            'critical': Grievance.objects.filter(
-                due_date__lt=today - timedelta(days=3)
-            ).count(),
-        }
-        stats['by_dept'] = (
-            Grievance.objects.values('department__name')
-            .annotate(count=Count('id'))
-            .order_by('-count')[:5]
-        )
-        return Response(stats)
+        return Response(stats.snapshot())
 
 
 # Single instances - no duplicates
@@ -334,7 +309,7 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAdminUser]
 
 class MeView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     def get(self, request):
         serializer = UserSerializer(request.user)
@@ -350,12 +325,13 @@ class GrievanceEventListView(generics.ListAPIView):
 
         # same access rules as GrievanceViewSet
         user = self.request.user
-        if user.is_staff or user.groups.filter(name='TOP_AUTHORITY').exists():
+        user_roles = roles.for_user(user)
+        if user.is_staff or user_roles.is_top_authority:
             pass
-        elif user.groups.filter(name='DEPARTMENT_ADMIN').exists():
-            if not Department.objects.filter(admin=user, id=grievance.department_id).exists():
+        elif user_roles.is_department_admin:
+            if grievance.department_id not in user_roles.department_ids:
                 return GrievanceEvent.objects.none()
-        elif user.groups.filter(name='TRIAGE_USER').exists():
+        elif user_roles.is_triage:
             if not (grievance.category and grievance.category.name == "Other" and grievance.status == "In Review"):
                 return GrievanceEvent.objects.none()
 
@@ -0,0 +1,15 @@
+"""
+Gunicorn settings, picked up automatically from the working directory.
+
+SUGGESTION_PRELOAD chooses when workers load the suggestion model:
+``prefork`` loads once in the master (shared copy-on-write), ``boot`` loads in
+each worker before it accepts requests, ``lazy`` waits for the first request.
+"""
+import os
+
+preload_app = os.environ.get('SUGGESTION_PRELOAD', 'lazy') == 'prefork'
+
+
+def post_worker_init(worker):
+    from grievance_api import inference
+    inference.preload('worker')
@@ -9,7 +9,7 @@ from django.db import connection
 
 print("🚀 Resetting Grievance data...")
 
-# 1. Delete all data
+# 1. Delete all data (their photos and documents are released from the media store too)
 print("Deleting Grievance records...")
 Grievance.objects.all().delete()
 
@@ -24,6 +24,7 @@ connection.commit()
 
 print("✅ COMPLETE! New grievances start at ID:1")
 print("💡 Test: Submit grievance → Check dashboard ID:1")
+print("💡 Files left by grievances deleted before media dedupe existed: python manage.py dedupe_media")
 
 
 # Command to run:
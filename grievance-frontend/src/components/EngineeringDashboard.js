@@ -6,8 +6,13 @@ const EngineeringDashboard = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
-  const [currentPage, setCurrentPage] = useState(1);
+  // ✅ keyset pagination: cursors[i] fetches page i + 1 (null = first page)
+  const [cursors, setCursors] = useState([null]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [overdueCount, setOverdueCount] = useState(0);
   const grievancesPerPage = 10;
+  const department = 'Engineering';
+  const currentPage = cursors.length;
 
   const daysLeft = (dueDate) => {
     if (!dueDate) return 'No SLA';
@@ -36,40 +41,37 @@ const EngineeringDashboard = () => {
         setLoading(true);
         setError(null);
 
-        // ✅ RULE: baseURL already contains /api/ so use relative endpoint
-        const response = await apiClient.get('grievances/', {
-          params: {
-            department: 'Engineering',
-            page: currentPage,
-            search: searchTerm,
-          },
-        });
-
-        setGrievances(response.data.results || response.data);
+        // ✅ RULE: baseURL already has /api/ so relative endpoint only
+        // filtering and paging happen on the server
+        const search = searchTerm.trim() || undefined;
+        const [pageRes, overdueRes] = await Promise.all([
+          apiClient.get('grievances/', {
+            params: {
+              department,
+              search,
+              page_size: grievancesPerPage,
+              cursor: cursors[cursors.length - 1] || undefined,
+            },
+          }),
+          apiClient.get('grievances/count/', {
+            params: { department, search, overdue: 'true' },
+          }),
+        ]);
+
+        setGrievances(pageRes.data.results || []);
+        setNextCursor(pageRes.data.next ? new URL(pageRes.data.next).searchParams.get('cursor') : null);
+        setOverdueCount(overdueRes.data.count);
       } catch (err) {
-        setError("Could not load grievances. Please try again later.");
+        setError('Could not load grievances. Please try again later.');
       } finally {
         setLoading(false);
       }
     };
 
     fetchGrievances();
-  }, [currentPage, searchTerm]);
-
-  const filteredGrievances = grievances.filter((grievance) =>
-    (grievance.title || '').toLowerCase().includes(searchTerm.toLowerCase()) ||
-    (grievance.description || '').toLowerCase().includes(searchTerm.toLowerCase())
-  );
-
-  const indexOfLastGrievance = currentPage * grievancesPerPage;
-  const indexOfFirstGrievance = indexOfLastGrievance - grievancesPerPage;
-  const currentGrievances = filteredGrievances.slice(indexOfFirstGrievance, indexOfLastGrievance);
-  const totalPages = Math.ceil(filteredGrievances.length / grievancesPerPage);
+  }, [cursors, searchTerm]);
 
-  const overdueCount = filteredGrievances.filter(g => {
-    const d = daysLeft(g.due_date);
-    return d !== 'No SLA' && d < 0;
-  }).length;
+  const currentGrievances = grievances;
 
   if (loading) return <h2 className="text-center">Loading grievances...</h2>;
   if (error) return <h2 className="text-danger text-center">{error}</h2>;
@@ -90,7 +92,10 @@ const EngineeringDashboard = () => {
         className="form-control mb-4 w-50"
         placeholder="Search by title or description..."
         value={searchTerm}
-        onChange={(e) => setSearchTerm(e.target.value)}
+        onChange={(e) => {
+          setSearchTerm(e.target.value);
+          setCursors([null]); // new search → back to the first page
+        }}
       />
 
       <div className="table-responsive">
@@ -151,27 +156,26 @@ const EngineeringDashboard = () => {
         </table>
       </div>
 
-      {totalPages > 1 && (
+      {(currentPage > 1 || nextCursor) && (
         <div className="d-flex justify-content-between align-items-center mt-4">
           <div>
-            Showing {indexOfFirstGrievance + 1} to {Math.min(indexOfLastGrievance, filteredGrievances.length)}
-            {' '}of {filteredGrievances.length} grievances
+            Showing {grievances.length} grievances
           </div>
           <div className="btn-group">
             <button
               className="btn btn-outline-primary"
               disabled={currentPage === 1}
-              onClick={() => setCurrentPage(currentPage - 1)}
+              onClick={() => setCursors(cursors.slice(0, -1))}
             >
               Previous
             </button>
             <span className="btn btn-light disabled">
-              Page {currentPage} of {totalPages}
+              Page {currentPage}
             </span>
             <button
               className="btn btn-outline-primary"
-              disabled={currentPage === totalPages}
-              onClick={() => setCurrentPage(currentPage + 1)}
+              disabled={!nextCursor}
+              onClick={() => setCursors([...cursors, nextCursor])}
             >
               Next
             </button>
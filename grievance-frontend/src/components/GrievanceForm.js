@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useContext } from 'react';
+import React, { useState, useEffect, useContext, useRef } from 'react';
 import { AuthContext } from '../context/AuthContext';
 import apiClient from '../apiClient';
 import { useNavigate } from 'react-router-dom';
@@ -32,6 +32,9 @@ const GrievanceFormContent = () => {
   const [location, setLocation] = useState('');
   const [images, setImages] = useState([]);
   const [suggestedCategories, setSuggestedCategories] = useState([]);
+  // ✅ lets the server drop our older queued suggestion requests
+  const suggestSession = useRef(Math.random().toString(36).slice(2));
+  const suggestSeq = useRef(0);
 
   const navigate = useNavigate();
 
@@ -50,16 +53,25 @@ const GrievanceFormContent = () => {
 
   useEffect(() => {
     const fetchSuggestions = async () => {
-      setSuggestedCategories([]);
-      if (description.length < 8) return;
+      if (description.length < 8) {
+        setSuggestedCategories([]);
+        return;
+      }
 
+      const seq = ++suggestSeq.current;
       try {
-        const res = await apiClient.post('suggest-complaint-type/', { description });
-        if (res.data && res.data.suggestions) {
+        const res = await apiClient.post('suggest-complaint-type/', {
+          description,
+          session: suggestSession.current,
+          seq,
+        });
+        if (seq !== suggestSeq.current) return; // a newer request is in flight
+        // 202 = server busy: keep the current suggestions
+        if (res.status === 200 && res.data && res.data.suggestions) {
           setSuggestedCategories(res.data.suggestions);
         }
       } catch (err) {
-        setSuggestedCategories([]);
+        if (seq === suggestSeq.current) setSuggestedCategories([]);
       }
     };
     fetchSuggestions();
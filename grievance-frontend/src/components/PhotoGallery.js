@@ -22,7 +22,8 @@ export default function PhotoGallery({ photos }) {
     ? p
     : (p?.image || p?.url || p?.file || p?.image_url || p?.src || p?.path);
 
-const mainUrl = toUrl(getPath(selectedPhoto));
+// the viewer and strip use the server's medium/thumbnail renditions when present
+const mainUrl = toUrl(selectedPhoto?.medium || getPath(selectedPhoto));
 
 
   console.log("PhotoGallery photos[0]:", photos?.[0]);
@@ -41,7 +42,7 @@ console.log("mainUrl:", mainUrl);
 
       <div className="photo-gallery-thumbnails">
         {photos.map((photo, index) => {
-          const thumbUrl = toUrl(getPath(photo));
+          const thumbUrl = toUrl(photo?.thumbnail || getPath(photo));
 if (!thumbUrl) return null;
 
 return (
@@ -159,7 +159,7 @@ const leafCategories = getLeafCategories(categories).filter(
                   <td>
                     <select
                       className="triage-select"
-                      value={categoryAssign[g.id] || ''}
+                      value={categoryAssign[g.id] || g.suggested_category || ''}
                      onChange={(e) =>
   setCategoryAssign(prev => ({ ...prev, [g.id]: parseInt(e.target.value, 10) }))
 }
@@ -170,12 +170,19 @@ const leafCategories = getLeafCategories(categories).filter(
                         <option key={c.id} value={c.id}>{c.full_path || c.name}</option>
                       ))}
                     </select>
+                    {/* ✅ model suggestion from `manage.py auto_classify` */}
+                    {g.suggested_category_name && (
+                      <small className="triage-suggestion">
+                        Suggested: {g.suggested_category_name}
+                        {g.suggestion_confidence != null && ` (${Math.round(g.suggestion_confidence * 100)}%)`}
+                      </small>
+                    )}
                   </td>
                   <td>
                     <button
                       className="triage-assign-btn"
-                      onClick={() => handleAssign(g.id, categoryAssign[g.id])}
-                      disabled={assignLoading[g.id] || !categoryAssign[g.id]}
+                      onClick={() => handleAssign(g.id, categoryAssign[g.id] || g.suggested_category)}
+                      disabled={assignLoading[g.id] || !(categoryAssign[g.id] || g.suggested_category)}
                     >
                       {assignLoading[g.id] ? 'Assigning...' : 'Assign'}
                     </button>
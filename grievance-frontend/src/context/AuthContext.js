@@ -45,6 +45,14 @@ const login = async (data) => {
 
 
   const logout = () => {
+    // revoke the token server-side too; the local logout doesn't wait for it, so the
+    // header is set here: the interceptor runs later, after the token is cleared below
+    const token = auth?.token || localStorage.getItem('authToken');
+    if (token) {
+      apiClient
+        .post('auth/logout/', null, { headers: { Authorization: `Token ${token}` } })
+        .catch(() => {});
+    }
     setAuth(null);
     localStorage.removeItem('authToken');
     localStorage.removeItem('user');